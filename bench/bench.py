@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# =============================================================================
+# Author: Ashkan Mirzaee
+# Organization: University of Missouri RCSS
+# License: GPL-3.0
+# Date: 2026/10/18
+# Source: https://github.com/ashki23/sbox
+# =============================================================================
+
+import os
+import sys
+import json
+import time
+import pathlib
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+root = pathlib.Path(__file__).resolve().parent.parent
+cases = {
+    'account': ['-a'],
+    'fairshare': ['-f'],
+    'group': ['-g'],
+    'queue': ['-q'],
+    'job': ['-j', '1000001'],
+    'cpu': ['-c'],
+    'partition': ['-p'],
+    'history': ['--history', 'month'],
+    'eff': ['--eff', '1000001', '--window', '1'],
+    'eff-report': ['--eff-report', '--since', 'week'],
+    'running': ['--running'],
+    'pending': ['--pending'],
+    'qos': ['--qos'],
+    'quota': ['--quota'],
+    'ncpu': ['--ncpu'],
+    'ngpu': ['--ngpu'],
+    'gpu': ['--gpu'],
+    'license': ['--license'],
+    'reserve': ['--reserve'],
+    'topusage': ['--topusage'],
+    'whodat': ['--whodat', 'user1', 'user2', 'ser3'],
+    'whodat2': ['--whodat2', 'Number7'],
+    'login': ['-a', '-f', '-g', '-q', '--qos', '--quota'],
+    'prompt': ['--prompt'],
+}
+# interactive.py cases run with an empty HOME and cache; off login nodes 'interactive' stops with exit 1 after picking the partition
+interactive_cases = {
+    'interactive': ['-p', 'auto'],
+    'jupyter': ['jupyter', '-p', 'auto', '--new'],
+}
+cases |= interactive_cases
+
+parser = argparse.ArgumentParser(description = 'Benchmark sbox flags and interactive against the fake Slurm/Lustre/LDAP commands in bench/bin.', formatter_class = lambda prog: argparse.HelpFormatter(prog,max_help_position = 56))
+parser.add_argument('cases', nargs = '*', help = f"cases to run (default all: {', '.join(cases)})", metavar = 'CASE')
+parser.add_argument('-r', '--repeat', type = int, default = 3, help = 'runs per case', metavar = 'N')
+parser.add_argument('--nodes', type = int, default = 100, help = 'synthetic nodes', metavar = 'N')
+parser.add_argument('--jobs', type = int, default = 1000, help = 'synthetic jobs in the queue', metavar = 'N')
+parser.add_argument('--users', type = int, default = 50, help = 'synthetic users', metavar = 'N')
+parser.add_argument('--groups', type = int, default = 4, help = 'posix groups of the benchmark user', metavar = 'N')
+parser.add_argument('--latency', type = float, default = 0, help = 'seconds added to every fake command', metavar = 'SECONDS')
+parser.add_argument('--cache', action = 'store_true', help = 'let sbox use its cache (runs with --no-cache otherwise)')
+parser.add_argument('--save', help = 'write results as JSON lines', metavar = 'FILE')
+parser.add_argument('--compare', help = 'compare with results saved by --save and fail on regressions', metavar = 'FILE')
+parser.add_argument('--tolerance', type = float, default = 1.25, help = 'allowed wall time ratio against --compare', metavar = 'RATIO')
+args = parser.parse_args()
+for name in args.cases:
+    if name not in cases:
+        parser.error(f"unknown case {name} (choose from {', '.join(cases)})")
+
+env = dict(os.environ, PATH = f"{root}/bench/bin:{os.environ.get('PATH', '')}", USER = os.getenv('USER') or 'bench',
+           FAKE_NODES = str(args.nodes), FAKE_JOBS = str(args.jobs), FAKE_USERS = str(args.users), FAKE_GROUPS = str(args.groups), FAKE_LATENCY = str(args.latency))
+
+def measure(script, argv):
+    # Wall time, fake command calls and peak RSS (the script and its waited-for children) of one run
+    with tempfile.NamedTemporaryFile(prefix = 'sbox-bench-') as log, tempfile.TemporaryDirectory(prefix = 'sbox-bench-') as home:
+        run_env = dict(env, FAKE_LOG = log.name)
+        if script == 'interactive.py':
+            run_env |= {'HOME': home, 'XDG_RUNTIME_DIR': home}
+        start = time.monotonic()
+        proc = subprocess.Popen([sys.executable, f'{root}/{script}', *argv], stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, env = run_env)
+        pid, status, usage = os.wait4(proc.pid, 0)
+        wall = time.monotonic() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        calls = [json.loads(line) for line in open(log.name)]
+    return {'wall': wall, 'calls': len(calls), 'command_wall': sum(c['wall'] for c in calls), 'maxrss': usage.ru_maxrss / 1024, 'status': proc.returncode}
+
+baseline = {}
+if args.compare:
+    with open(args.compare) as saved:
+        baseline = {r['case']: r for r in map(json.loads, saved)}
+
+results = []
+print(f"{'case':12} {'wall(s)':>9} {'min(s)':>9} {'calls':>6} {'cmd(s)':>8} {'rss(MB)':>8} {'exit':>5} {'vs base':>8}")
+for name in args.cases or cases:
+    script = 'interactive.py' if name in interactive_cases else 'sbox.py'
+    argv = cases[name] + ([] if args.cache or script != 'sbox.py' else ['--no-cache'])
+    runs = [measure(script, argv) for i in range(args.repeat)]
+    result = {'case': name, 'argv': argv, 'wall': statistics.median(r['wall'] for r in runs), 'min': min(r['wall'] for r in runs),
+              'calls': runs[-1]['calls'], 'command_wall': statistics.median(r['command_wall'] for r in runs),
+              'maxrss': max(r['maxrss'] for r in runs), 'status': runs[-1]['status'],
+              'nodes': args.nodes, 'jobs': args.jobs, 'latency': args.latency}
+    ratio = result['wall'] / baseline[name]['wall'] if name in baseline else None
+    result['ratio'] = ratio
+    results.append(result)
+    print(f"{name:12} {result['wall']:>9.3f} {result['min']:>9.3f} {result['calls']:>6} {result['command_wall']:>8.3f} {result['maxrss']:>8.1f} {result['status']:>5} {f'{ratio:.2f}x' if ratio else '-':>8}")
+
+if args.save:
+    with open(args.save, 'w') as out:
+        out.writelines(json.dumps(r) + '\n' for r in results)
+
+regressions = [r['case'] for r in results if r['ratio'] and r['ratio'] > args.tolerance]
+if regressions:
+    print(f"\nSlower than {args.tolerance}x the baseline: {', '.join(regressions)}")
+    sys.exit(1)
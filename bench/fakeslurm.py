@@ -0,0 +1,315 @@
+#!/usr/bin/python3
+# =============================================================================
+# Author: Ashkan Mirzaee
+# Organization: University of Missouri RCSS
+# License: GPL-3.0
+# Date: 2026/10/18
+# Source: https://github.com/ashki23/sbox
+# =============================================================================
+
+# Stand-in for sinfo, squeue, sprio, sacct, sacctmgr, sshare, scontrol, sbatch, srun, sstat,
+# seff, sjstat, sreport, lfs, ldapsearch, groups, module and jupyter-lab, dispatched on the
+# name it is called by (see bench/bin).
+# The synthetic cluster is deterministic and sized by environment variables:
+#   FAKE_NODES (100)  FAKE_JOBS (1000)  FAKE_USERS (50)  FAKE_GROUPS (4)
+#   FAKE_HISTORY_PER_DAY (50)  FAKE_LATENCY / FAKE_LATENCY_<CMD> (seconds)
+#   FAKE_LOG (append one JSON line per call)  FAKE_USER (defaults to $USER)
+
+import os
+import re
+import sys
+import json
+import time
+import pathlib
+import datetime
+
+with open(f'{pathlib.Path(__file__).resolve().parent.parent}/config') as cfg:
+    config = json.load(cfg)
+
+command = os.path.basename(sys.argv[0])
+argv = sys.argv[1:]
+env = lambda name, default: type(default)(os.getenv(f'FAKE_{name}', default))
+n_nodes = env('NODES', 100)
+n_jobs = env('JOBS', 1000)
+n_users = env('USERS', 50)
+me = os.getenv('FAKE_USER') or os.getenv('USER') or 'user0'
+partitions = list(dict.fromkeys(config['cpu_partition'] + config['gpu_partition']))
+now = datetime.datetime(2026, 10, 18, 12, 0, 0)
+
+start = time.monotonic()
+time.sleep(float(os.getenv(f'FAKE_LATENCY_{command.upper()}', os.getenv('FAKE_LATENCY', 0))))
+
+def log():
+    if os.getenv('FAKE_LOG'):
+        with open(os.environ['FAKE_LOG'], 'a') as out:
+            out.write(json.dumps({'cmd': command, 'argv': argv, 'wall': round(time.monotonic() - start, 4)}) + '\n')
+
+def option(*names, default = None):
+    # Value of --name VALUE, --name=VALUE or -n VALUE
+    for i, a in enumerate(argv):
+        for n in names:
+            if a == n and i + 1 < len(argv):
+                return argv[i + 1]
+            if a.startswith(n + '=') and n.startswith('--'):
+                return a.split('=', 1)[1]
+    return default
+
+def flag(*names):
+    return any(a in names for a in argv)
+
+def user_name(i):
+    return me if i == 0 else f'user{i}'
+
+# nodes: name, partition, cpus, memory MB, gpus
+def node(i):
+    part = partitions[i % len(partitions)]
+    gpus = 4 if part in config['gpu_partition'] else 0
+    return f'n{i:05d}', part, 32 + 16 * (i % 3), 128000 * (1 + i % 2), gpus
+
+# jobs: id, user, account, state, partition, cpus, nodes (first node index, count), gpus per node, priority
+def job(j):
+    n = node(j % n_nodes)
+    state = 'RUNNING' if j % 3 else 'PENDING'
+    count = 1 + (j % 7 == 0)
+    return {'id': 1000000 + j, 'user': user_name(j % n_users), 'account': f'acct{j % 13}', 'state': state, 'partition': n[1],
+            'cpus': 1 + j % 16, 'first': j % n_nodes, 'count': count, 'gpus': 1 if n[4] else 0, 'priority': 10000 - (j * 7919) % 10000,
+            'name': 'jupyter-py' if j % 97 == 0 else f'job{j % 100}'}
+
+def hostlist(first, count):
+    return f'n{first:05d}' if count == 1 else f'n[{first:05d}-{first + count - 1:05d}]'
+
+def compile_format(fmt):
+    # %[.][width]X -> {X:>width} ('.' right aligns) so rows are rendered with str.format_map
+    fmt = fmt.replace('{', '{{').replace('}', '}}')
+    return re.sub(r'%(\.)?(\d+)?([a-zA-Z])', lambda m: '{%s:%s%s}' % (m.group(3), '>' if m.group(1) else '<', m.group(2) or ''), fmt)
+
+class Values(dict):
+    # Unknown format letters render empty
+    def __missing__(self, key):
+        return ''
+
+def render(fmt, values):
+    return compile_format(fmt).format_map(Values((k, str(v)) for k, v in values.items()))
+
+def write(lines):
+    out = sys.stdout
+    try:
+        for line in lines:
+            out.write(line + '\n')
+        out.flush()
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+
+def sinfo():
+    wanted = set(option('-p', '--partition', default = ','.join(partitions)).split(','))
+    fmt = option('-o', '--format')
+    header = not flag('-h', '--noheader')
+    rows = []
+    if flag('-N', '--Node'):
+        fmt = fmt or '%N %.6D %P %T'
+        for i in range(n_nodes):
+            name, part, cpus, mem, gpus = node(i)
+            if part not in wanted:
+                continue
+            alloc = (i * 5) % (cpus + 1)
+            rows.append(render(fmt, {'N': name, 'n': name, 'R': part, 'P': part, 'D': 1, 'T': 'mixed', 'C': f'{alloc}/{cpus - alloc}/0/{cpus}',
+                                     'm': mem, 'e': mem // 2, 'G': f'gpu:a100:{gpus}(S:0-1)' if gpus else '(null)'}))
+    else:
+        fmt = fmt or '%P %.5a %.10l %.6D %.6t %N'
+        for part in partitions:
+            if part in wanted:
+                count = sum(1 for i in range(n_nodes) if node(i)[1] == part)
+                rows.append(render(fmt, {'P': part, 'R': part, 'a': 'up', 'l': '2-00:00:00', 'D': count, 'F': f'{count // 2}/{count - count // 2}/0/{count}',
+                                         'n': 'n00000', 'G': 'gpu:a100:4' if part in config['gpu_partition'] else '(null)'}))
+    if header:
+        rows.insert(0, render(fmt, {c: c for c in 'NnRPDTCmeGalFt'}))
+    write(rows)
+
+def squeue():
+    users = option('-u', '--user')
+    states = option('-t', '--states')
+    jobids = option('-j', '--jobs')
+    names = option('-n', '--name')
+    fmt = option('-o', '--format') or '%.18i %.9P %.8j %.8u %.2t %.10M %.6D %R'
+    states = set(s.upper().replace('PD', 'PENDING').replace('R', 'RUNNING') if len(s) <= 2 else s.upper() for s in states.split(',')) if states else None
+    jobids = set(jobids.split(',')) if jobids else None
+    header = not flag('-h', '--noheader')
+
+    titles = {'i': 'JOBID', 'u': 'USER', 'a': 'ACCOUNT', 'T': 'STATE', 't': 'ST', 'P': 'PARTITION', 'q': 'QOS', 'C': 'CPUS', 'D': 'NODES', 'm': 'MIN_MEMORY',
+              'V': 'SUBMIT_TIME', 'S': 'START_TIME', 'M': 'TIME', 'l': 'TIME_LIMIT', 'N': 'NODELIST', 'R': 'NODELIST(REASON)', 'Y': 'SCHEDNODES',
+              'r': 'REASON', 'b': 'TRES_PER_NODE', 'Q': 'PRIORITY', 'j': 'NAME'}
+    template = compile_format(fmt)
+
+    def rows():
+        if header:
+            yield template.format_map(Values(titles))
+        for j in range(n_jobs):
+            if users and user_name(j % n_users) not in users.split(','):
+                continue
+            job_ = job(j)
+            if states and job_['state'] not in states or jobids and str(job_['id']) not in jobids or names and job_['name'] not in names.split(','):
+                continue
+            running = job_['state'] == 'RUNNING'
+            nodes = hostlist(job_['first'], job_['count'])
+            yield template.format_map(Values({'i': job_['id'], 'u': job_['user'], 'a': job_['account'], 'T': job_['state'], 't': 'R' if running else 'PD',
+                               'P': job_['partition'], 'q': 'normal', 'C': job_['cpus'], 'D': job_['count'], 'm': '4G', 'V': '2026-10-18T10:00:00',
+                               'S': '2026-10-18T10:05:00' if running else f'2026-10-19T{j % 24:02d}:00:00', 'M': '1:02:03' if running else '0:00',
+                               'l': '2:00:00', 'N': nodes if running else '', 'R': nodes if running else '(Priority)', 'Y': '' if running else nodes,
+                               'r': 'None' if running else ('Priority', 'Resources')[j % 2], 'b': f"gres/gpu:{job_['gpus']}" if job_['gpus'] else 'N/A',
+                               'Q': job_['priority'], 'j': job_['name']}))
+    write(rows())
+
+def sprio():
+    fmt = option('-o', '--format') or '%.15i %9r %.8u %.10Y'
+    header = not flag('-h', '--noheader')
+    template = compile_format(fmt)
+
+    def rows():
+        if header:
+            yield template.format_map(Values({'i': 'JOBID', 'r': 'PARTITION', 'u': 'USER', 'Y': 'PRIORITY'}))
+        for j in range(0, n_jobs, 3):
+            job_ = job(j)
+            yield template.format_map(Values({'i': job_['id'], 'r': job_['partition'], 'u': job_['user'], 'Y': job_['priority']}))
+    write(rows())
+
+def sacct():
+    fields = [f.split('%')[0].lower() for f in option('--format', '-o', default = 'jobid,jobname,partition,account,alloccpus,state,exitcode').split(',')]
+    parsable = flag('-P', '--parsable2', '-p', '--parsable')
+    allocations = flag('-X', '--allocations')
+    jobids = option('-j', '--jobs')
+    begin = option('-S', '--starttime')
+    end = option('-E', '--endtime')
+    parse_day = lambda d: datetime.datetime.fromisoformat(d[:10]) if d and d[0].isdigit() else None
+    begin = parse_day(begin) or now - datetime.timedelta(days = 1)
+    end = parse_day(end) or now
+    per_day = env('HISTORY_PER_DAY', 50)
+    if jobids:
+        ids = [int(i.split('_')[0].split('.')[0]) for i in jobids.split(',')]
+    else:
+        first = (begin - datetime.datetime(2020, 1, 1)).days * per_day
+        ids = range(first, first + max((end - begin).days, 1) * per_day)
+    # Ids of the synthetic queue keep their squeue state
+    queued = lambda j: job(j - 1000000)['state'] if 1000000 <= j < 1000000 + n_jobs else None
+
+    def value(f, j, step):
+        day = datetime.datetime(2020, 1, 1) + datetime.timedelta(days = j // env('HISTORY_PER_DAY', 50), seconds = 60 * (j % 1000))
+        values = {'jobid': f'{j}{step}', 'jobidraw': f'{j}{step}', 'user': me, 'account': f'acct{j % 13}', 'state': queued(j) or ('COMPLETED', 'FAILED', 'TIMEOUT')[j % 3],
+                  'partition': partitions[j % len(partitions)], 'qos': 'normal', 'ncpus': 1 + j % 16, 'alloccpus': 1 + j % 16, 'nnodes': 1, 'reqmem': '8G',
+                  'submit': day.isoformat(), 'reserved': '00:00:05', 'start': day.isoformat(), 'elapsed': '01:00:00', 'end': (day + datetime.timedelta(hours = 1)).isoformat(),
+                  'timelimit': '02:00:00', 'nodelist': f'n{j % n_nodes:05d}', 'jobname': f'job{j % 100}', 'totalcpu': f'{(1 + j % 16) * (20 + j % 40)}:00',
+                  'maxrss': f'{(j % 8000) + 100}M' if step else '', 'exitcode': '0:0'}
+        return str(values.get(f, ''))
+
+    def rows():
+        if not flag('-n', '--noheader'):
+            yield ('|' if parsable else ' ').join(f.capitalize() for f in fields)
+        for j in ids:
+            for step in [''] + ([] if allocations else ['.batch']):
+                yield ('|' if parsable else ' ').join(value(f, j, step) for f in fields)
+    write(rows())
+
+def sacctmgr():
+    if 'qos' in argv:
+        write(['normal|2-00:00:00|1000|||||', 'interactive|04:00:00|2||||cpu=4|', 'gpu4|2-00:00:00|100|||||'])
+    else:
+        write([f'acct{i}|' for i in range(3)] if '-np' in argv or '-nP' in argv else ['   Account  Share  QOS'] + [f'     acct{i}      1  normal' for i in range(3)])
+
+def sshare():
+    write(['Account                    User  RawShares  NormShares    RawUsage  EffectvUsage  FairShare',
+           '-------------------- ---------- ---------- ----------- ----------- ------------- ----------'] +
+          [f'acct{i:<16} {me:>10}          1    0.010000      123456      0.001000   0.500000' for i in range(3)])
+
+def scontrol():
+    if 'licenses' in argv:
+        write(['LicenseName=matlab Total=50 Used=10 Free=40 Reserved=0 Remote=no'])
+    elif 'reserv' in argv or 'reservation' in argv:
+        write(['No reservations in the system'])
+    else:
+        write([f'JobId={argv[-1]} JobName=job UserId={me}(1000) JobState=RUNNING Partition={partitions[0]}'])
+
+def sbatch():
+    if flag('--test-only'):
+        part = option('--partition', '-p', default = partitions[0])
+        print(f'sbatch: Job 999999 to start at 2026-10-18T{12 + len(part) % 10:02d}:00:00 using 1 processors on nodes n00000 in partition {part}', file = sys.stderr)
+    else:
+        jobid = 1000000 + n_jobs
+        script = pathlib.Path(argv[-1]) if argv else None
+        # A Jupyter job "starts" at once: its output file gets the server banner interactive waits for
+        text = script.read_text() if script and script.is_file() else ''
+        output = re.search(r'^#SBATCH --output (\S+)', text, re.M)
+        if output and 'jupyter-lab' in text:
+            pathlib.Path(output.group(1).replace('%j', str(jobid))).write_text(
+                '[I 2026-10-18 12:00:00.000 ServerApp] Jupyter Server is running at:\n'
+                '[I 2026-10-18 12:00:00.000 ServerApp] http://n00000:8888/lab?token=bench\n'
+                '[I 2026-10-18 12:00:00.000 ServerApp]  or http://127.0.0.1:8888/lab?token=bench\n'
+                '[I 2026-10-18 12:00:00.000 ServerApp] Use Control-C to stop this server and shut down all kernels (twice to skip confirmation).\n')
+        print(f'{jobid};cluster' if flag('--parsable') else f'Submitted batch job {jobid}')
+
+def srun():
+    if flag('--test-only'):
+        part = option('--partition', '-p', default = partitions[0])
+        print(f'srun: Job 999999 to start at 2026-10-18T{12 + len(part) % 10:02d}:00:00 using 1 processors on nodes n00000 in partition {part}', file = sys.stderr)
+
+def sstat():
+    t = int(time.time())
+    write([f'{option("-j", "--jobs")}.batch|1|00:{t % 60:02d}:00|1.5G|2G', f'{option("-j", "--jobs")}.0|4|{t // 60 % 60:02d}:{t % 60:02d}:00|500M|600M'])
+
+def seff():
+    j = argv[-1] if argv else '0'
+    write([f'Job ID: {j}', 'Cluster: cluster', f'User/Group: {me}/{me}', 'State: COMPLETED (exit code 0)', 'Cores: 4', 'CPU Utilized: 02:30:00',
+           'CPU Efficiency: 62.50% of 04:00:00 core-walltime', 'Job Wall-clock time: 01:00:00', 'Memory Utilized: 3.00 GB', 'Memory Efficiency: 37.50% of 8.00 GB'])
+
+def sjstat():
+    # -c: nodes grouped by partition, memory and cpus
+    pools = {}
+    for i in range(n_nodes):
+        name, part, cpus, mem, gpus = node(i)
+        pools[part, mem, cpus] = pools.get((part, mem, cpus), 0) + 1
+    write(['Scheduling pool data:', '-' * 64, 'Pool        Memory  Cpus  Total Usable   Free  Other Traits', '-' * 64] +
+          [f'{part:<11} {mem:>6}Mb {cpus:>5} {count:>6} {count:>6} {count // 2:>6}' for (part, mem, cpus), count in pools.items()])
+
+def sreport():
+    write(['-' * 80, 'Top 10 Users 2026-10-17T00:00:00 - 2026-10-17T23:59:59 (86400 secs)', 'Usage reported in CPU Minutes', '-' * 80,
+           '  Cluster     Login     Proper Name         Account     Used   Energy', '--------- --------- --------------- --------------- -------- --------'] +
+          [f"  cluster {user_name(i):>9} {f'User Number{i}':>15} {f'acct{i % 13}':>15} {100000 // (i + 1):>8}        0" for i in range(min(10, n_users))])
+
+def module():
+    # "module load X" succeeds so the Jupyter module check finds the fake jupyter-lab
+    pass
+
+def jupyter_lab():
+    pass
+
+def lfs():
+    if len(argv) < 4 or argv[0] != 'quota':
+        return
+    kind, name, path = argv[1], argv[2], argv[3]
+    write([f"Disk quotas for {'grp' if 'g' in kind else 'usr'} {name} (id 1000):",
+           '     Filesystem    used   quota   limit   grace   files   quota   limit   grace',
+           f'{path:>15}  {len(name) * 1.5:.1f}G   100G    110G       -   {len(name) * 1000}       0       0       -'])
+
+def ldapsearch():
+    query = argv[-1]
+    terms = re.findall(r'\((\w+)=([^()]*)\)', query)
+    entries = []
+    for i in range(n_users):
+        uid = user_name(i)
+        gecos = f'User Number{i}'
+        for attr, term in terms:
+            value = uid if attr == 'uid' else gecos
+            pattern = '^' + '.*'.join(re.escape(p) for p in term.split('*')) + '$'
+            if re.match(pattern, value, re.I):
+                entries += [f'dn: uid={uid},ou=people,dc=example,dc=edu', f'uid: {uid}', f'gecos: {gecos}', f'mail: {uid}@example.edu', '']
+                break
+    write(entries)
+
+def groups():
+    name = argv[0] if argv else me
+    print(f"{name} : {name} " + ' '.join(f'grp{i}' for i in range(env('GROUPS', 4))))
+
+try:
+    {'sinfo': sinfo, 'squeue': squeue, 'sacct': sacct, 'sacctmgr': sacctmgr, 'sshare': sshare, 'scontrol': scontrol, 'sbatch': sbatch,
+     'srun': srun, 'sstat': sstat, 'sprio': sprio, 'seff': seff, 'sjstat': sjstat, 'sreport': sreport, 'lfs': lfs, 'ldapsearch': ldapsearch,
+     'groups': groups, 'module': module, 'jupyter-lab': jupyter_lab}[command]()
+finally:
+    log()
@@ -0,0 +1,132 @@
+# =============================================================================
+# Author: Ashkan Mirzaee
+# Organization: University of Missouri RCSS
+# License: GPL-3.0
+# Date: 2026/10/18
+# Source: https://github.com/ashki23/sbox
+# =============================================================================
+
+import os
+import json
+import stat
+import time
+import glob
+import hashlib
+import tempfile
+
+
+class Cache:
+    # File cache for slow-changing lookups. The user scope lives in a private
+    # directory; the shared scope is a sticky directory on the node where every
+    # user writes its own copy of an entry and readers take the freshest one
+    # they trust: their own, root's or one of the configured service uids.
+    def __init__(self, settings, enabled = True, refresh = False):
+        uid = os.getuid()
+        runtime = os.getenv('XDG_RUNTIME_DIR')
+        self.uid = uid
+        self.ttl = settings.get('ttl', {})
+        self.max_entries = settings.get('max_entries', 512)
+        self.max_bytes = settings.get('max_bytes', 8 * 2**20)
+        self.enabled = enabled
+        self.refresh = refresh
+        self.trusted = {uid, 0, *settings.get('trusted_uids', [])}
+        self.dirs = {
+            'user': settings.get('user_dir') or (f'{runtime}/sbox' if runtime else f'/dev/shm/sbox-{uid}'),
+            'shared': settings.get('shared_dir', '/dev/shm/sbox'),
+        }
+
+    def get(self, kind, key, fetch, scope = 'user'):
+        value = self.peek(kind, key, scope)
+        if value is not None:
+            return value
+        value = fetch()
+        self.put(kind, key, value, scope)
+        return value
+
+    def peek(self, kind, key, scope = 'user'):
+        ttl = self.ttl.get(kind, 0)
+        if not self.enabled or self.refresh or ttl <= 0:
+            return None
+        return self._read(scope, self._name(kind, key), key, ttl)
+
+    def put(self, kind, key, value, scope = 'user'):
+        if self.enabled and value and self.ttl.get(kind, 0) > 0:
+            self._write(scope, self._name(kind, key), key, value)
+
+    def _name(self, kind, key):
+        return f"{kind}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+
+    def _private(self, directory, create):
+        # The user directory may be a predictable path in /dev/shm; use it only if it is ours and closed to others
+        try:
+            if create:
+                os.makedirs(directory, mode = 0o700, exist_ok = True)
+            st = os.lstat(directory)
+        except OSError:
+            return False
+        return stat.S_ISDIR(st.st_mode) and st.st_uid == self.uid and not st.st_mode & 0o077
+
+    def _read(self, scope, name, key, ttl):
+        if scope == 'user' and not self._private(self.dirs[scope], False):
+            return None
+        now = time.time()
+        fresh = []
+        for path in glob.glob(f"{self.dirs[scope]}/{name}.*.json"):
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            # Future mtimes would never expire
+            if stat.S_ISREG(st.st_mode) and st.st_uid in self.trusted and 0 <= now - st.st_mtime < ttl and not st.st_mode & 0o022:
+                fresh.append((st.st_mtime, path))
+        for mtime, path in sorted(fresh, reverse = True):
+            try:
+                with open(path) as entry:
+                    data = json.load(entry)
+            except (OSError, ValueError):
+                continue
+            if data.get('key') == key:
+                return data.get('value')
+        return None
+
+    def _write(self, scope, name, key, value):
+        directory = self.dirs[scope]
+        if scope == 'user' and not self._private(directory, True):
+            return
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, mode = 0o700, exist_ok = True)
+                os.chmod(directory, 0o1777)
+            fd, tmp = tempfile.mkstemp(dir = directory, prefix = '.tmp-')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'w') as entry:
+                json.dump({'key': key, 'value': value}, entry)
+            os.chmod(tmp, 0o644 if scope == 'shared' else 0o600)
+            os.replace(tmp, f"{directory}/{name}.{self.uid}.json")
+        except OSError:
+            os.unlink(tmp)
+            return
+        self._evict(directory)
+
+    def _evict(self, directory):
+        # Drop this user's expired entries, then the oldest ones over the bounds
+        entries = []
+        for path in glob.glob(f"{directory}/*.{self.uid}.json"):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort(reverse = True)
+        max_ttl = max(self.ttl.values(), default = 0)
+        now, count, size = time.time(), 0, 0
+        for mtime, nbytes, path in entries:
+            count += 1
+            size += nbytes
+            if count > self.max_entries or size > self.max_bytes or now - mtime > max_ttl:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -23,5 +23,55 @@
 	"gpu4": "gpu4"
     },
     "partition_general_account_deny": ["BioCompute","gpu3","gpu4","hpc6"],
-    "disk_quota_paths": ["/home", "/data", "/gprs", "/storage/htc"]
+    "disk_quota_paths": ["/home", "/data", "/gprs", "/storage/htc"],
+    "clusters": {},
+    "max_workers": 8,
+    "quota_workers": 8,
+    "quota_timeout": 10,
+    "history_chunk_days": 7,
+    "history_store": null,
+    "pager": true,
+    "lmod_cache_files": [],
+    "jupyter_poll": 1,
+    "jupyter_squeue_max_interval": 60,
+    "sboxd_socket": "/run/sboxd/sboxd.sock",
+    "sboxd_interval": 30,
+    "sboxd_timeout": 1,
+    "sboxd_private": true,
+    "eff_window": 10,
+    "eff_interval": 2,
+    "eff_wait": 0,
+    "prompt_interval": 60,
+    "prompt_format": "{running}R {pending}PD {jupyter}J",
+    "cache": {
+	"shared_dir": "/dev/shm/sbox",
+	"ttl": {
+	    "assoc": 3600,
+	    "qos": 3600,
+	    "groups": 3600,
+	    "partitions": 300,
+	    "ldap": 3600,
+	    "module": 86400
+	},
+	"max_entries": 512,
+	"max_bytes": 8388608,
+	"trusted_uids": []
+    },
+    "commands": {
+	"timeout": {
+	    "default": 60,
+	    "sacct": 300,
+	    "sreport": 120,
+	    "sstat": 30,
+	    "lfs": 10,
+	    "df": 10
+	},
+	"busy_retries": 3,
+	"busy_backoff": 1
+    },
+    "ldap": {
+	"uri": null,
+	"base": null,
+	"batch_size": 200
+    }
 }
@@ -8,10 +8,22 @@
 # =============================================================================
 
 import os
+import re
 import sys
 import json
+import time
+import ctypes
+import shutil
+import select
+import socket
 import pathlib
 import argparse
+import subprocess
+import ctypes.util
+import concurrent.futures
+import profiling
+from cache import Cache
+from runner import Runner
 
 with open(f'{pathlib.Path(__file__).parent.absolute()}/config') as cfg:
     config = json.load(cfg)
@@ -22,24 +34,217 @@ interactive_partition = list(config['interactive_partition_timelimit'].keys())
 interactive_timelimt = max(list(config['interactive_partition_timelimit'].values()))
 user = os.getenv('USER')
 home = os.getenv('HOME')
-host_name = os.popen('hostname').read().strip()
+host_name = socket.gethostname()
+cache = Cache(config.get('cache', {}))
+runner = Runner(config.get('commands', {}))
+
+def lmod_stamp():
+    # Newest mtime of the Lmod spider caches and MODULEPATH directories; any change invalidates cached checks
+    paths = config.get('lmod_cache_files', []) + [p for p in os.getenv('MODULEPATH', '').split(':') if p]
+    paths.append(f"{home}/.cache/lmod")
+    stamp = 0
+    for path in paths:
+        try:
+            stamp = max(stamp, os.stat(path).st_mtime)
+        except OSError:
+            pass
+    return int(stamp)
+
+def module_executable(module, executable):
+    # Path of executable after loading module, cached per module until the TTL or the Lmod caches change
+    key = f"{module}:{executable}:{os.getenv('MODULEPATH', '')}:{lmod_stamp()}"
+    return cache.get('module', key, lambda: subprocess.run(f"module load {module} > /dev/null 2>&1 && which {executable} 2> /dev/null", shell = True, capture_output = True, text = True).stdout.strip())
+
+def inotify_watch(directory):
+    # File descriptor that turns readable when files in directory change, None if inotify is unavailable
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    # IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE
+    if libc.inotify_add_watch(fd, directory.encode(), 0x002 | 0x008 | 0x100) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+def parse_server_line(line, server):
+    # Jupyter prints "[I ...] http://host:port/lab?token=..." then "[I ...]  or http://127.0.0.1:port/..."
+    match = re.search(r'http://([^\s:/]+):(\d+)\S*', line)
+    if match and '[' in line:
+        if re.search(r'\sor\s+http://', line):
+            server.setdefault('url', match.group(0))
+        elif match.group(1) not in ('127.0.0.1', 'localhost'):
+            server.setdefault('host', match.group(1))
+            server.setdefault('port', match.group(2))
+        token = re.search(r'token=(\w+)', line)
+        if token:
+            server.setdefault('token', token.group(1))
+    if 'use control-c' in line.lower():
+        server['ready'] = True
+
+def jupyter_jobs(kernel):
+    # [jobid, state, account, partition] of the user's running or pending Jupyter jobs, from one squeue call; none when squeue fails
+    try:
+        out = runner.run(['squeue', '-h', '-u', user, '-n', f'jupyter-{kernel}', '-t', 'PENDING,CONFIGURING,RUNNING', '-o', '%i|%T|%a|%P']).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    return [line.split('|') for line in out.splitlines() if line.count('|') == 3]
+
+def expected_start(partition):
+    # Slurm's start estimate for the request on a partition, None if it would be rejected
+    qos = config['partition_qos'].get(partition, 'normal')
+    gpus = args.gpu if args.gpu > 0 or partition not in config['gpu_partition'] else 1
+    request = [f'--partition={partition}', f'--qos={qos}', f'--account={args.account}', f'--ntasks={args.ntasks}', f'--nodes={args.nodes}',
+               f'--mem={args.mem}G', f'--gres=gpu:{gpus}', f'--time={args.time}:00:00']
+    if args.jupyter:
+        cmd = ['sbatch', '--test-only', *request, '--wrap', 'true']
+    else:
+        cmd = ['srun', '--test-only', *request] + ([f'--licenses={args.license}:1'] if args.license else []) + ['true']
+    try:
+        out = subprocess.run(cmd, capture_output = True, text = True, timeout = 30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(r'to start at (\S+)', out.stderr + out.stdout)
+    return match.group(1) if match else None
+
+def candidate_partitions():
+    # Partitions allowed for this account, gpu request and time
+    limits = config['jupyter_partition_timelimit' if args.jupyter else 'interactive_partition_timelimit']
+    return [p for p, limit in limits.items()
+            if args.time <= limit
+            and not (args.account == 'general' and p in config['partition_general_account_deny'])
+            and (p in config['gpu_partition']) == (args.gpu > 0)]
+
+def auto_partition(candidates):
+    # Candidates tested in parallel
+    with concurrent.futures.ThreadPoolExecutor(max_workers = max(len(candidates), 1)) as pool:
+        starts = list(pool.map(expected_start, candidates))
+    # ISO timestamps sort chronologically; ties keep the config order
+    tested = sorted((start, i, p) for i, (p, start) in enumerate(zip(candidates, starts)) if start)
+    if not tested:
+        print(f"No partition can run this request ({', '.join(candidates) or 'no candidates'}). Check the account, gpu and time options.")
+        sys.exit(1)
+    start, _, partition = tested[0]
+    print(f"Selected {partition} partition, expected to start at {start.replace('T', ' ')}.")
+    return partition
+
+def job_status(jid):
+    # [state, reason], ['', ''] once Slurm no longer knows the job, None when squeue failed or timed out
+    try:
+        proc = runner.run(['squeue', '-h', '-j', jid, '-o', '%T|%r'])
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    out = proc.stdout.strip()
+    if proc.returncode != 0:
+        return ['', ''] if 'Invalid job id' in proc.stderr else None
+    return out.split('|') if '|' in out else ['', '']
+
+def wait_for_server(jid, out_file):
+    # Tail the job output as it grows and check the job in squeue with a growing interval
+    poll = config.get('jupyter_poll', 1)
+    check, max_check = 5, config.get('jupyter_squeue_max_interval', 60)
+    watch = inotify_watch(os.path.dirname(out_file))
+    server, offset, partial = {}, 0, ''
+    start = time.monotonic()
+    next_check, warned = start + check, False
+    while not server.get('ready'):
+        try:
+            with open(out_file) as out:
+                out.seek(offset)
+                data = out.read()
+                offset = out.tell()
+        except FileNotFoundError:
+            data = ''
+        lines = (partial + data).split('\n')
+        partial = lines.pop()
+        for line in lines:
+            parse_server_line(line, server)
+        if server.get('ready'):
+            break
+        
+        now = time.monotonic()
+        if now >= next_check:
+            status = job_status(jid)
+            if status is None:
+                print("Could not reach Slurm to check the job, still waiting ...")
+                check = min(check * 2, max_check)
+                next_check = now + check
+                continue
+            state, reason = status
+            if reason == 'AccountNotAllowed':
+                print(f"{args.account} account not allowed to use {args.partition}. Use another account or change the partition")
+                sys.exit(1)
+            if state not in ('PENDING', 'CONFIGURING', 'RUNNING'):
+                print(f"Job {jid} is not in the queue anymore. Check {out_file} for errors.")
+                sys.exit(1)
+            print("Starting Jupyter server ...")
+            if not warned and now - start > 150:
+                warned = True
+                print("""
+It is taking more than usual to start the server.
+The following shows the status of your job in the queue:
+""")
+                subprocess.run(['squeue', '-j', jid])
+                print(f"""
+You can wait more if your job is waiting for resources (Priority or Resources) or cancel the job and try again.
+To Cancel your job press 'Control+C' and run 'scancel {jid}'.
+""")
+            check = min(check * 2, max_check)
+            next_check = now + check
+        
+        timeout = min(poll, max(next_check - time.monotonic(), 0))
+        if watch is not None:
+            if select.select([watch], [], [], timeout)[0]:
+                os.read(watch, 65536)
+        else:
+            time.sleep(timeout)
+    if watch is not None:
+        os.close(watch)
+    return server
 
 parser = argparse.ArgumentParser(description = 'An alias for using cluster interactively', formatter_class = lambda prog: argparse.HelpFormatter(prog,max_help_position = 56), epilog = 'Command should be run from the login node.')
 parser.add_argument('-A', '--account', default = 'general', help = 'account name', metavar = '')
 parser.add_argument('-n', '--ntasks', type = int, default = 1, help = 'number of tasks (cpus)', metavar = '')
 parser.add_argument('-N', '--nodes', type = int, default = 1, help = 'number of nodes', metavar = '')
 if 'jupyter' in sys.argv:
-    parser.add_argument('-p', '--partition', choices = jupyter_partition, default = jupyter_partition[0], help = 'partition name', metavar = '')
+    parser.add_argument('-p', '--partition', choices = jupyter_partition + ['auto'], default = jupyter_partition[0], help = 'partition name (auto picks the earliest start)', metavar = '')
     parser.add_argument('-t', '--time', type = int, choices = range(1, jupyter_timelimt + 1), default = 2, help = f'number of hours (up to {jupyter_timelimt})', metavar = '')
     parser.add_argument('-k', '--kernel', choices = ['R','Python'], default = 'Python', help = 'Jupyter kernel (R/Python)', metavar = '')
+    parser.add_argument('--new', action = 'store_true', help = 'start a new server even if a matching one is running')
 else:
-    parser.add_argument('-p', '--partition', choices = interactive_partition, default = interactive_partition[0], help = 'partition name', metavar = '')
+    parser.add_argument('-p', '--partition', choices = interactive_partition + ['auto'], default = interactive_partition[0], help = 'partition name (auto picks the earliest start)', metavar = '')
     parser.add_argument('-t', '--time', type = int, choices = range(1, interactive_timelimt + 1), default = 2, help = f'number of hours (up to {interactive_timelimt})', metavar = '')
     parser.add_argument('-l', '--license', help = 'license', metavar = '')
 parser.add_argument('-m', '--mem', type = int, default = 2, help = 'amount of memory per GB', metavar = '')
 parser.add_argument('-g', '--gpu', type = int, default = 0, choices = range(3), help = 'number of gpus', metavar = '')
+parser.add_argument('--profile', nargs = '?', const = '-', help = 'time external commands; print a summary or append JSON lines to FILE (also SBOX_PROFILE=1|FILE)', metavar = 'FILE')
 parser.add_argument('jupyter', nargs = '?', help = 'Starting Jupyter server on the cluster')
 args = parser.parse_args()
+if args.profile == 'jupyter':
+    args.profile, args.jupyter = '-', 'jupyter'
+args.profile = profiling.target(args.profile)
+if args.profile:
+    profiling.enable('interactive', args.profile)
+
+if args.jupyter and shutil.which('sbatch') is None:
+    print("No sbatch found! Command should be run from the login node.")
+    sys.exit(1)
+
+jobs = None
+if args.partition == 'auto':
+    candidates = candidate_partitions()
+    sessions = []
+    if args.jupyter and not args.new:
+        # A live Jupyter server on any candidate partition is reused before probing for a new one
+        jobs = jupyter_jobs('r' if args.kernel == 'R' else 'py')
+        sessions = sorted((j for j in jobs if j[2] == args.account.lower() and set(j[3].split(',')) & set(candidates)), key = lambda j: j[1] != 'RUNNING')
+    if sessions:
+        args.partition = next(p for p in sessions[0][3].split(',') if p in candidates)
+    else:
+        args.partition = auto_partition(candidates)
 
 if args.partition in config['partition_qos'].keys():
     qos = config['partition_qos'][args.partition]
@@ -95,14 +300,22 @@ if args.jupyter:
         kernel = 'py'
         module = 'anaconda'
     
-    ml_test = os.popen(f"if [ -z `module load {module} > /dev/null 2>&1 && which jupyter-lab 2> /dev/null` ]; then echo 'no-module-found'; fi").read().strip()
-    if ml_test == 'no-module-found':
-        print(f"No {module} module found!")
-        sys.exit(1)
-    
-    os.system(f"install -d ~/.jupyter/job")
-    with open(f"{home}/.jupyter/job/{kernel}-jupyter-job",'w') as jb:
-        jb.write(f"""#!/bin/bash
+    # Reconnect to a live server with the same account and partition instead of queueing a new one
+    if jobs is None:
+        jobs = jupyter_jobs(kernel)
+    live = {j[0] for j in jobs}
+    sessions = [j for j in jobs if j[2] == args.account.lower() and args.partition in j[3].split(',')]
+    sessions.sort(key = lambda j: j[1] != 'RUNNING')
+    if sessions and not args.new:
+        jid = sessions[0][0]
+        print(f"Reconnecting to the {sessions[0][1].lower()} Jupyter job {jid} on {args.partition} partition (use --new to start another server) ...")
+    else:
+        # The module check is the slow part; write the job script while it runs
+        preflight = concurrent.futures.ThreadPoolExecutor(max_workers = 1)
+        ml_test = preflight.submit(module_executable, module, 'jupyter-lab')
+        os.makedirs(f"{home}/.jupyter/job", exist_ok = True)
+        with open(f"{home}/.jupyter/job/{kernel}-jupyter-job",'w') as jb:
+            jb.write(f"""#!/bin/bash
 #SBATCH --job-name jupyter-{kernel}
 #SBATCH --account {args.account}
 #SBATCH --partition {args.partition}
@@ -115,40 +328,32 @@ if args.jupyter:
 #SBATCH --output {home}/.jupyter/job/{kernel}-%j.out
 module load {module}
 jupyter-lab --no-browser --ip 0.0.0.0
-        """)
+            """)
+        
+        if not ml_test.result():
+            print(f"No {module} module found!")
+            sys.exit(1)
+        preflight.shutdown()
+        
+        for old in pathlib.Path(f"{home}/.jupyter/job").glob(f"{kernel}-*.out"):
+            if old.stem.split('-', 1)[1] not in live:
+                old.unlink()
+        sbatch = subprocess.run(['sbatch', '--parsable', f"{home}/.jupyter/job/{kernel}-jupyter-job"], cwd = home, capture_output = True, text = True)
+        jid = sbatch.stdout.strip().split(';')[0]
+        if sbatch.returncode != 0 or not jid:
+            print(sbatch.stderr.strip())
+            sys.exit(1)
+        print(announce)
+        print("Starting Jupyter server (it might take about a couple minutes) ...")
     
-    os.system(f"""
-cd ~
-rm -f ~/.jupyter/job/{kernel}-*.out
-jid=$(sbatch --parsable ~/.jupyter/job/{kernel}-jupyter-job)
-echo {announce}
-echo "Starting Jupyter server (it might take about a couple minutes) ..."
-myn=0
-while ! grep -iq 'use control-c' ~/.jupyter/job/{kernel}-$jid.out > /dev/null 2>&1; do
-sleep 10
-if squeue -j $jid | grep -q AccountNotAllowed; then echo "{args.account} account not allowed to use {args.partition}. Use another account or change the partition"; exit; fi
-echo "Starting Jupyter server ..."
-myn=`expr $myn + 1`
-if [ $myn -eq 15 ]; then
-echo "
-It is taking more than usual to start the server.
-The following shows the status of your job in the queue:
-"
-squeue -j $jid
-echo "
-You can wait more if your job is waiting for resources (Priority or Resources) or cancel the job and try again.
-To Cancel your job press 'Control+C' and run 'scancel $jid'.
-"
-fi
-done
-unset jid myn i
-cd - > /dev/null 2>&1
-    """)
-
-    jid = os.popen("ls -t ~/.jupyter/job/%s-*.out 2> /dev/null | head -n 1 | grep -Po '(?<=job/%s-).*(?=.out)'" % (kernel,kernel)).read().strip()
-    port = os.popen("cat ~/.jupyter/job/%s-%s.out 2> /dev/null | grep '\[.*\].http://' | grep -Po '(?<=http://).*' | grep -Po '(?<=:)\d{4}(?=/?)'" % (kernel,jid)).read().strip()
-    host = os.popen(f"cat ~/.jupyter/job/{kernel}-{jid}.out 2> /dev/null | grep '\[.*\].http://' | grep -Po '(?<=http://).*' | grep -Po '.*(?=:)'").read().strip()
-    url = os.popen(f"cat ~/.jupyter/job/{kernel}-{jid}.out 2> /dev/null | grep '\[.*\].*or.*http://' | grep -Po '(?<=or ).*'").read().strip()
+    try:
+        server = wait_for_server(jid, f"{home}/.jupyter/job/{kernel}-{jid}.out")
+    except KeyboardInterrupt:
+        print(f"\nThe job {jid} is still in the queue. To cancel it run 'scancel {jid}'.")
+        sys.exit(1)
+    port = server.get('port', '')
+    host = server.get('host', '')
+    url = server.get('url') or f"http://127.0.0.1:{port}/lab?token={server.get('token', '')}"
     
     if len(jid) > 0:
         print(f"""
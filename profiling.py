@@ -0,0 +1,194 @@
+# =============================================================================
+# Author: Ashkan Mirzaee
+# Organization: University of Missouri RCSS
+# License: GPL-3.0
+# Date: 2026/10/18
+# Source: https://github.com/ashki23/sbox
+# =============================================================================
+
+import os
+import sys
+import json
+import time
+import atexit
+import socket
+import inspect
+import threading
+import subprocess
+import collections
+import concurrent.futures
+
+records = []
+sections = collections.defaultdict(float)
+local = threading.local()
+lock = threading.Lock()
+started = time.monotonic()
+
+def current_section():
+    return getattr(local, 'section', 'main')
+
+def command_name(args):
+    # First word of an argv list or of the first line of a shell script
+    if isinstance(args, (list, tuple)):
+        return os.path.basename(str(args[0])) if args else ''
+    for line in str(args).splitlines():
+        if line.strip():
+            return os.path.basename(line.split()[0])
+    return ''
+
+
+class CountingStream:
+    # Counts what the caller reads from a pipe outside of communicate()
+    def __init__(self, stream, record):
+        self._stream = stream
+        self._record = record
+
+    def _count(self, data):
+        if not self._record.get('communicating'):
+            self._record['bytes'] += len(data)
+        return data
+
+    def read(self, *args):
+        return self._count(self._stream.read(*args))
+
+    def readline(self, *args):
+        return self._count(self._stream.readline(*args))
+
+    def __iter__(self):
+        for line in self._stream:
+            yield self._count(line)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class ProfiledPopen(subprocess.Popen):
+    def __init__(self, args, *posargs, **kwargs):
+        self._profile = {'section': current_section(), 'command': command_name(args), 'argv': ' '.join(args.split() if isinstance(args, str) else map(str, args)),
+                         'start': time.monotonic(), 'wall': None, 'bytes': 0, 'timeout': False, 'returncode': None}
+        with lock:
+            records.append(self._profile)
+        try:
+            super().__init__(args, *posargs, **kwargs)
+        except OSError as err:
+            self._profile['wall'] = time.monotonic() - self._profile['start']
+            self._profile['error'] = str(err)
+            raise
+        if self.stdout is not None:
+            self.stdout = CountingStream(self.stdout, self._profile)
+
+    def communicate(self, input = None, timeout = None):
+        self._profile['communicating'] = True
+        try:
+            out, err = super().communicate(input, timeout)
+        except subprocess.TimeoutExpired:
+            self._profile['timeout'] = True
+            raise
+        finally:
+            self._profile['communicating'] = False
+        self._profile['bytes'] += len(out or '') + len(err or '')
+        return out, err
+
+    def wait(self, timeout = None):
+        returncode = super().wait(timeout)
+        if self._profile['wall'] is None:
+            self._profile['wall'] = time.monotonic() - self._profile['start']
+            self._profile['returncode'] = returncode
+        return returncode
+
+
+def profiled_system(command, system = os.system):
+    record = {'section': current_section(), 'command': command_name(command), 'argv': ' '.join(command.split()), 'start': time.monotonic(), 'bytes': None, 'timeout': False}
+    with lock:
+        records.append(record)
+    status = system(command)
+    record['wall'] = time.monotonic() - record['start']
+    record['returncode'] = os.waitstatus_to_exitcode(status) if status >= 0 else status
+    return status
+
+def in_section(name, run):
+    # Attribute the commands run by a section (or by the generator it returns) to it
+    def timed(fn):
+        previous = current_section()
+        local.section = name
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            sections[name] += time.monotonic() - start
+            local.section = previous
+    result = timed(run)
+    if inspect.isgenerator(result):
+        def stream():
+            iterator = iter(result)
+            while True:
+                try:
+                    yield timed(lambda: next(iterator))
+                except StopIteration:
+                    return
+        return stream()
+    return result
+
+def submit(submit = concurrent.futures.ThreadPoolExecutor.submit):
+    # Pool threads started inside a section (quota probes, sinfo/squeue pairs) count towards it
+    def wrapped(self, fn, *args, **kwargs):
+        name = current_section()
+        def run():
+            previous = current_section()
+            local.section = name
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                local.section = previous
+        return submit(self, run)
+    return wrapped
+
+def summary():
+    total = time.monotonic() - started
+    calls = [r for r in records if r['wall'] is not None]
+    out = ' Profile '.center(90,'-') + '\n'
+    out += f"{'section':16}{'wall(s)':>10}{'calls':>7}{'cmd(s)':>10}{'bytes':>12}{'timeouts':>10}\n"
+    for name in list(sections) + (['main'] if any(r['section'] == 'main' for r in calls) or not sections else []):
+        own = [r for r in calls if r['section'] == name]
+        out += f"{name:16}{sections.get(name, total):>10.3f}{len(own):>7}{sum(r['wall'] for r in own):>10.3f}{sum(r['bytes'] or 0 for r in own):>12}{sum(r['timeout'] for r in own):>10}\n"
+    out += f"\n{'command':16}{'calls':>7}{'wall(s)':>10}{'max(s)':>10}{'bytes':>12}{'timeouts':>10}\n"
+    by_command = collections.defaultdict(list)
+    for r in calls:
+        by_command[r['command']].append(r)
+    for name, own in sorted(by_command.items(), key = lambda item: -sum(r['wall'] for r in item[1])):
+        out += f"{name:16}{len(own):>7}{sum(r['wall'] for r in own):>10.3f}{max(r['wall'] for r in own):>10.3f}{sum(r['bytes'] or 0 for r in own):>12}{sum(r['timeout'] for r in own):>10}\n"
+    out += f"\n{len(records)} processes, {total:.3f} seconds total\n"
+    return out
+
+def json_lines(tool):
+    # One line per external command and one per run, ready to aggregate across login nodes
+    base = {'tool': tool, 'host': socket.gethostname(), 'user': os.getenv('USER'), 'pid': os.getpid(), 'time': round(time.time(), 3)}
+    lines = [dict(base, type = 'command', **{k: v for k, v in r.items() if k not in ('start', 'communicating')}) for r in records]
+    lines.append(dict(base, type = 'run', argv = sys.argv[1:], wall = round(time.monotonic() - started, 4), processes = len(records),
+                      sections = {k: round(v, 4) for k, v in sections.items()}))
+    return ''.join(json.dumps(line, default = str) + '\n' for line in lines)
+
+def enable(tool, target):
+    # target '-' prints a summary table to stderr, anything else is a JSON lines log file
+    subprocess.Popen = ProfiledPopen
+    os.system = profiled_system
+    concurrent.futures.ThreadPoolExecutor.submit = submit()
+    def report():
+        if target == '-':
+            print(summary(), file = sys.stderr, end = '')
+            return
+        fd = os.open(os.path.expanduser(target), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, json_lines(tool).encode())
+        finally:
+            os.close(fd)
+    atexit.register(report)
+
+def target(value):
+    # --profile value (None when not given, '-' without a file) or SBOX_PROFILE=1|FILE
+    if value is not None:
+        return value
+    env = os.getenv('SBOX_PROFILE')
+    if not env or env == '0':
+        return None
+    return '-' if env in ('1', 'summary') else env
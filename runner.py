@@ -0,0 +1,67 @@
+# =============================================================================
+# Author: Ashkan Mirzaee
+# Organization: University of Missouri RCSS
+# License: GPL-3.0
+# Date: 2026/10/18
+# Source: https://github.com/ashki23/sbox
+# =============================================================================
+
+import os
+import time
+import random
+import subprocess
+
+# Messages Slurm clients print when slurmctld/slurmdbd is overloaded or failing over
+busy_messages = [
+    'Socket timed out on send/recv operation',
+    'Unable to contact slurm controller',
+    'Resource temporarily unavailable',
+    'Slurm backup controller in standby mode',
+    'failed to open persistent connection',
+]
+
+
+class CommandError(Exception):
+    pass
+
+
+class Runner:
+    # Runs commands by argv, without a shell, with per-command timeouts and retries while the controller is busy
+    def __init__(self, settings):
+        self.timeouts = settings.get('timeout', {})
+        self.retries = settings.get('busy_retries', 3)
+        self.backoff = settings.get('busy_backoff', 1)
+        self.busy = busy_messages + settings.get('busy_messages', [])
+
+    def timeout(self, argv):
+        name = os.path.basename(argv[0])
+        return self.timeouts.get(name, self.timeouts.get('default', 60))
+
+    def run(self, argv, timeout = None, merge = False):
+        # Like subprocess.run with captured text output; TimeoutExpired and OSError are left to the caller
+        timeout = timeout or self.timeout(argv)
+        for attempt in range(self.retries + 1):
+            proc = subprocess.run(argv, stdout = subprocess.PIPE, stderr = subprocess.STDOUT if merge else subprocess.PIPE, text = True, timeout = timeout)
+            errors = proc.stdout if merge else proc.stderr
+            if proc.returncode == 0 or attempt == self.retries or not any(m in errors for m in self.busy):
+                return proc
+            # Full jitter keeps many login sessions from retrying in step
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        return proc
+
+    def output(self, argv, check = False, timeout = None):
+        # stdout on success; the error text otherwise, raised as CommandError with check so callers never cache it
+        name = os.path.basename(argv[0])
+        try:
+            proc = self.run(argv, timeout)
+        except subprocess.TimeoutExpired as err:
+            error = f'{name}: timed out after {err.timeout:g} seconds\n'
+        except OSError as err:
+            error = f'{name}: {err.strerror}\n'
+        else:
+            if proc.returncode == 0:
+                return proc.stdout
+            error = proc.stdout + (proc.stderr or f'{name}: exited with status {proc.returncode}\n')
+        if check:
+            raise CommandError(error)
+        return error
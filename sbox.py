@@ -9,9 +9,32 @@
 
 import os
 import sys
+
+# Prompt hooks run --prompt on every Enter; answer from the snapshot before anything else is imported
+if sys.argv[1:2] == ['--prompt']:
+    import prompt
+    prompt.show()
+
 import json
+import time
 import pathlib
 import argparse
+import base64
+import datetime
+import statistics
+import shlex
+import shutil
+import tempfile
+import subprocess
+import signal
+import socket
+import threading
+import collections
+import concurrent.futures
+import slurm
+import profiling
+from cache import Cache
+from runner import Runner, CommandError
 
 
 with open(f'{pathlib.Path(__file__).parent.absolute()}/config') as cfg:
@@ -19,7 +42,391 @@ with open(f'{pathlib.Path(__file__).parent.absolute()}/config') as cfg:
 
 part_cpu = config['cpu_partition']
 part_gpu = config['gpu_partition']
+clusters = config.get('clusters', {})
 user = os.getenv('USER')
+host_name = socket.gethostname()
+runner = Runner(config.get('commands', {}))
+
+def sboxd(op, **request):
+    # Ask the node-local snapshot daemon; None means query Slurm directly
+    path = config.get('sboxd_socket')
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(config.get('sboxd_timeout', 1))
+            conn.connect(path)
+            conn.sendall((json.dumps({'op': op, **request}) + '\n').encode())
+            reply = conn.makefile().readline()
+        reply = json.loads(reply)
+    except (OSError, ValueError):
+        return None
+    return reply.get('data') if isinstance(reply, dict) else None
+
+def cluster_setting(cluster, key):
+    # A cluster's own partitions or quota paths, falling back to the top level of config
+    return clusters.get(cluster, {}).get(key, config[key]) if cluster else config[key]
+
+def cluster_option(cluster):
+    # The daemon only knows the local cluster
+    return ['--clusters', cluster] if cluster else []
+
+def across_clusters(query):
+    # query(cluster) for every --clusters entry at once, in the given order; the local cluster (None) otherwise
+    names = args.clusters or [None]
+    with concurrent.futures.ThreadPoolExecutor(max_workers = len(names)) as pool:
+        return list(zip(names, pool.map(query, names)))
+
+def cluster_capacity(partitions, cluster = None):
+    # One sinfo snapshot of every node/partition pair, summed per partition
+    cap = None if cluster else sboxd('capacity', partitions = partitions)
+    if cap is not None:
+        return cap
+    out = runner.output(['sinfo', *cluster_option(cluster), '--noheader', '--Node', '--partition', ','.join(partitions), '--format', slurm.node_format], check = True)
+    return slurm.capacity(slurm.parse_nodes(out), partitions)
+
+def gpu_usage(partitions, cluster = None):
+    # One sinfo and one squeue snapshot, GPUs counted per node and summed per partition
+    usage = None if cluster else sboxd('gpus', partitions = partitions)
+    if usage is not None:
+        return usage
+    out = runner.output(['sinfo', *cluster_option(cluster), '--noheader', '--Node', '--partition', ','.join(partitions), '--format', slurm.node_format], check = True)
+    nodes = slurm.parse_nodes(out)
+    out = runner.output(['squeue', *cluster_option(cluster), '--noheader', '--states', 'RUNNING', '--format', '%b|%N'], check = True)
+    running = [line.strip().split('|') for line in out.splitlines() if line.count('|') == 1]
+    return slurm.gpu_usage(nodes, running, partitions)
+
+def user_jobs(uid, states, cluster = None):
+    # The user's jobs as dicts keyed by slurm.job_fields, from the daemon snapshot or one squeue call
+    jobs = None if cluster else sboxd('jobs', user = uid, states = states)
+    if jobs is not None:
+        return [dict(zip(jobs['fields'], row)) for row in jobs['rows']]
+    cmd = ['squeue', *cluster_option(cluster), '--noheader', '--user', uid, '--format', slurm.job_format]
+    if states:
+        cmd += ['--states', ','.join(states)]
+    fields = [f for f, code in slurm.job_fields]
+    return [dict(zip(fields, row)) for row in slurm.parse_jobs(runner.output(cmd, check = True))]
+
+def queue_positions(uid, cluster = None):
+    # Where the user's pending jobs stand, from the daemon snapshot or one squeue and one sprio pass over the whole queue
+    reply = None if cluster else sboxd('positions', user = uid)
+    if reply is None:
+        with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as pool:
+            sprio = pool.submit(runner.output, ['sprio', *cluster_option(cluster), '--noheader', '--format', slurm.priority_format])
+            jobs = slurm.parse_jobs(runner.output(['squeue', *cluster_option(cluster), '--noheader', '--all', '--states', 'PENDING', '--format', slurm.job_format], check = True))
+            # Without sprio the squeue priority is used
+            positions = slurm.queue_positions(jobs, slurm.parse_priorities(sprio.result()))
+        reply = {'fields': [f for f, code in slurm.job_fields] + slurm.position_fields, 'rows': slurm.user_positions(jobs, positions, uid)}
+    jobs = [dict(zip(reply['fields'], map(str, row))) for row in reply['rows']]
+    for j in jobs:
+        j['place'] = f"{j['position']} of {j['queued']}"
+    return jobs
+
+def slurm_seconds(value):
+    # [DD-][HH:]MM:SS[.mmm] -> seconds
+    days, _, clock = value.strip().rpartition('-')
+    seconds = 0.0
+    for part in clock.split(':'):
+        seconds = seconds * 60 + float(part or 0)
+    return seconds + int(days or 0) * 86400
+
+def slurm_duration(start, end):
+    # Two ISO timestamps -> [DD-]HH:MM:SS like sacct's Reserved, '' when either is unknown
+    try:
+        seconds = int((datetime.datetime.fromisoformat(end) - datetime.datetime.fromisoformat(start)).total_seconds())
+    except ValueError:
+        return ''
+    days, rest = divmod(max(seconds, 0), 86400)
+    return (f'{days}-' if days else '') + f'{rest // 3600:02}:{rest % 3600 // 60:02}:{rest % 60:02}'
+
+def slurm_bytes(value):
+    # 1234K, 12.5M, 4Gn, 0 -> bytes
+    value = value.strip().rstrip('nc')
+    units = 'KMGTP'
+    if value and value[-1].upper() in units:
+        return float(value[:-1] or 0) * 1024 ** (units.index(value[-1].upper()) + 1)
+    return float(value or 0)
+
+def human_bytes(value):
+    for unit in 'BKMGT':
+        if value < 1024 or unit == 'T':
+            return f'{value:.1f}{unit}' if unit != 'B' else f'{int(value)}B'
+        value /= 1024
+
+def job_state(jobid):
+    out = runner.output(['sacct', '-X', '-n', '-P', '-j', str(jobid), '--format', 'State'], check = True).split()
+    return out[0] if out else ''
+
+def step_usage(jobid):
+    # Cumulative CPU seconds, current RSS and peak RSS summed over all tasks of all running steps of a job
+    out = runner.run(['sstat', '-n', '-P', '-a', '-j', str(jobid), '--format', 'JobID,NTasks,AveCPU,AveRSS,MaxRSS']).stdout
+    cpu, rss, peak, steps = 0.0, 0.0, 0.0, 0
+    for line in out.splitlines():
+        fields = line.split('|')
+        if len(fields) < 5 or not fields[1].isdigit():
+            continue
+        ntasks = int(fields[1])
+        cpu += slurm_seconds(fields[2]) * ntasks
+        rss += slurm_bytes(fields[3]) * ntasks
+        # MaxRSS is the largest task of the step, so the peak total is an upper bound on the same basis as RSS
+        peak += slurm_bytes(fields[4]) * ntasks
+        steps += 1
+    return (cpu, rss, peak) if steps else None
+
+def live_efficiency(jobid, window, interval):
+    alloc = runner.output(['squeue', '-h', '-j', str(jobid), '-o', '%C|%m']).strip().split('|')
+    ncpus = int(alloc[0]) if alloc[0].isdigit() else 1
+    samples = []
+    # A window shorter than the interval still needs two samples to measure cpu use
+    interval = min(interval, max(window, 1))
+    deadline = time.monotonic() + window
+    while True:
+        usage = step_usage(jobid)
+        if usage is None:
+            break
+        samples.append((time.monotonic(), *usage))
+        if len(samples) > 1 and time.monotonic() + interval > deadline:
+            break
+        time.sleep(interval)
+    if len(samples) < 2:
+        return f'No step accounting data available for job {jobid}. Make sure the job has a running step (sstat -a -j {jobid}).\n'
+    cpu_util = [100 * (b[1] - a[1]) / ((b[0] - a[0]) * ncpus) for a, b in zip(samples, samples[1:])]
+    rss = [s[2] for s in samples]
+    out = f"Sampled {len(samples)} times over {samples[-1][0] - samples[0][0]:.0f} seconds with {ncpus} allocated cpus"
+    out += f" and {alloc[1]} requested memory\n\n" if len(alloc) > 1 else "\n\n"
+    out += f"{'':12}{'min':>10}{'avg':>10}{'max':>10}\n"
+    out += f"{'CPU util':12}{min(cpu_util):>9.1f}%{sum(cpu_util) / len(cpu_util):>9.1f}%{max(cpu_util):>9.1f}%\n"
+    out += f"{'RSS':12}{human_bytes(min(rss)):>10}{human_bytes(sum(rss) / len(rss)):>10}{human_bytes(max(rss)):>10}\n"
+    out += f"{'Peak RSS':12}{human_bytes(samples[-1][3]):>30}\n\n"
+    out += 'CPU util: cpu time used by all steps over the sampling window divided by the allocated cpus\n'
+    out += 'RSS: resident memory summed over all tasks of all running steps\n'
+    out += 'Peak RSS: largest task peak of each step times its task count, an upper bound on the highest RSS\n'
+    return out
+
+def history_start(window):
+    days = {'day': 1, 'week': 7, 'month': 30, 'year': 365}[window]
+    return datetime.date.today() - datetime.timedelta(days = days)
+
+history_fields = [('JobID', 10), ('User', 6), ('Account', 7), ('State', 10), ('Partition', 9), ('QOS', 7), ('NCPUS', 5), ('NNodes', 5), ('ReqMem', 5),
+                  ('Submit', 19), ('Reserved', 10), ('Start', 19), ('Elapsed', 10), ('End', 19), ('NodeList', 30), ('JobName', 15)]
+
+def sacct_history(uid, start, end):
+    # Stream one time chunk of finished allocations from sacct
+    cmd = ['sacct', '--user', uid, '--state', 'bf,ca,cd,dl,f,nf,pr,s,to', '--allocations', '--parsable2', '--noheader',
+           '--format', ','.join(f for f, w in history_fields), '-S', start.isoformat(), '-E', end.isoformat() if end <= datetime.date.today() else 'now']
+    # Failures are raised after the rows so store_history never saves an incomplete chunk
+    timeout = runner.timeout(cmd)
+    killed = threading.Event()
+    with tempfile.TemporaryFile('w+') as errors:
+        try:
+            proc = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = errors, text = True)
+        except OSError as err:
+            raise CommandError(f'sacct: {err.strerror}\n')
+        with proc:
+            def kill():
+                killed.set()
+                proc.kill()
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+            try:
+                for line in proc.stdout:
+                    yield line.rstrip('\n').split('|')
+            finally:
+                timer.cancel()
+            if killed.is_set():
+                raise CommandError(f'sacct: timed out after {timeout:g} seconds\n')
+            if proc.wait() != 0:
+                errors.seek(0)
+                raise CommandError(errors.read() or f'sacct: exited with status {proc.returncode}\n')
+
+def stored_history(path):
+    with open(path) as rows:
+        for line in rows:
+            yield line.rstrip('\n').split('|')
+
+def store_history(rows, store_dir, start, end):
+    # Pass rows through and, once the chunk is complete, save the finished days by job end date
+    today = datetime.date.today()
+    days = {(start + datetime.timedelta(days = i)).isoformat(): [] for i in range((min(end, today) - start).days)}
+    for row in rows:
+        if len(row) == len(history_fields) and row[13][:10] in days:
+            days[row[13][:10]].append(row)
+        yield row
+    os.makedirs(store_dir, mode = 0o700, exist_ok = True)
+    for day, day_rows in days.items():
+        fd, tmp = tempfile.mkstemp(dir = store_dir, prefix = '.tmp-')
+        with os.fdopen(fd, 'w') as out:
+            out.writelines('|'.join(r) + '\n' for r in day_rows)
+        os.replace(tmp, f'{store_dir}/{day}.psv')
+
+def history_rows(uid, window):
+    # Walk the window in chunks; days already in the local store are read back instead of queried
+    today = datetime.date.today()
+    chunk = config.get('history_chunk_days', 7)
+    store = config.get('history_store')
+    store_dir = os.path.expanduser(f'{store}/{uid}') if store else None
+    stored = lambda d: store_dir and d < today and os.path.exists(f'{store_dir}/{d}.psv')
+    seen = set()
+    day = history_start(window)
+    while day <= today:
+        if stored(day):
+            rows = stored_history(f'{store_dir}/{day}.psv')
+            end = day + datetime.timedelta(days = 1)
+        else:
+            end = day + datetime.timedelta(days = 1)
+            while (end - day).days < chunk and end <= today and not stored(end):
+                end += datetime.timedelta(days = 1)
+            rows = sacct_history(uid, day, end)
+            if store_dir:
+                rows = store_history(rows, store_dir, day, end)
+        for row in rows:
+            if len(row) == len(history_fields) and row[0] not in seen:
+                seen.add(row[0])
+                yield row
+        day = end
+
+running_fields = history_fields[:13] + [('Timelimit', 10)] + history_fields[14:]
+
+def format_row(row, fields = history_fields):
+    return ' '.join(cell.rjust(w) if len(cell) <= w else cell[:w - 1] + '+' for cell, (f, w) in zip(row, fields)) + '\n'
+
+# squeue layouts for daemon rows: (header, job field, width), width 0 for the unpadded last column
+queue_columns = [('JOBID', 'jobid', -18), ('PARTITION', 'partition', -9), ('NAME', 'name', -8), ('USER', 'user', -8), ('ST', 'st', -2),
+                 ('TIME', 'time', -10), ('NODES', 'nodes', -6), ('NODELIST(REASON)', 'reason_list', 0)]
+pending_columns = [('JOBID', 'jobid', 10), ('PARTITION', 'partition', 9), ('QOS', 'qos', 7), ('CPUS', 'cpus', 5), ('PRIORITY', 'priority', 10),
+                   ('POSITION', 'place', 11), ('CPUS_AHEAD', 'cpus_ahead', 10), ('START_TIME', 'start', 20), ('REASON', 'reason', 12), ('NAME', 'name', 0)]
+
+def cluster_columns(columns):
+    # Merged --clusters views lead with the cluster of each row
+    return [('CLUSTER', 'cluster', 10)] + columns if args.clusters else columns
+
+def squeue_table(jobs, columns):
+    # Negative widths are right aligned like squeue's %.Ni
+    def cell(value, w):
+        return value if w == 0 else f'{value:>{-w}.{-w}}' if w < 0 else f'{value:<{w}.{w}}'
+    rows = [[h for h, f, w in columns]] + [[j[f] for h, f, w in columns] for j in jobs]
+    return ''.join(' '.join(cell(v, w) for v, (h, f, w) in zip(row, columns)) + '\n' for row in rows)
+
+def page(lines):
+    # Send a streamed section through $PAGER when printing to a terminal
+    if not sys.stdout.isatty() or not config.get('pager', True):
+        try:
+            for line in lines:
+                sys.stdout.write(line)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            lines.close()
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return
+    sys.stdout.flush()
+    with subprocess.Popen(shlex.split(os.getenv('PAGER') or 'less -FRX'), stdin = subprocess.PIPE, text = True) as pager:
+        try:
+            for line in lines:
+                pager.stdin.write(line)
+            pager.stdin.close()
+        except BrokenPipeError:
+            lines.close()
+
+def job_efficiency(sacct_lines):
+    # Allocation rows carry elapsed/cpu/request, step rows carry MaxRSS
+    jobs = {}
+    for line in sacct_lines:
+        fields = line.split('|')
+        if len(fields) != 8:
+            continue
+        jobid, state, elapsed, totalcpu, ncpus, nnodes, maxrss, reqmem = fields
+        alloc = jobid.split('.')[0]
+        if alloc == jobid:
+            jobs[alloc] = {'jobid': jobid, 'state': state.split()[0], 'elapsed': slurm_seconds(elapsed) if elapsed else 0, 'cpu': slurm_seconds(totalcpu) if totalcpu else 0,
+                           'ncpus': int(ncpus or 0), 'nnodes': int(nnodes or 0), 'reqmem': reqmem, 'maxrss': 0}
+        elif alloc in jobs and maxrss:
+            jobs[alloc]['maxrss'] = max(jobs[alloc]['maxrss'], slurm_bytes(maxrss))
+    
+    rows = [j for j in jobs.values() if j['elapsed'] > 0 and j['ncpus'] > 0 and j['state'] not in ('RUNNING', 'PENDING')]
+    for j in rows:
+        req = j['reqmem']
+        scale = j['ncpus'] if req.endswith('c') else j['nnodes'] if req.endswith('n') else 1
+        j['reqbytes'] = slurm_bytes(req) * scale if req else 0
+        j['cpu_eff'] = 100 * j['cpu'] / (j['elapsed'] * j['ncpus'])
+        j['mem_eff'] = 100 * j['maxrss'] / j['reqbytes'] if j['reqbytes'] else 0
+    return rows
+
+def percentiles(values):
+    if len(values) < 2:
+        return values * 3
+    deciles = statistics.quantiles(values, n = 10, method = 'inclusive')
+    return [deciles[0], statistics.median(values), deciles[-1]]
+
+def cached(kind, key, argv, scope = 'user'):
+    # Output of a command through the cache; failures are shown but never cached
+    try:
+        return cache.get(kind, key, lambda: runner.output(argv, check = True), scope)
+    except CommandError as err:
+        return str(err)
+
+def banner(title, width = 90):
+    return f' {title} '.center(width,'-') + '\n'
+
+def ldap_escape(value):
+    return ''.join(f'\\{ord(c):02x}' if c in '\\*()\0' else c for c in value)
+
+def parse_ldif(text):
+    # -> [(entry text, {attr: [values]})], continuation lines unfolded and base64 values decoded
+    entries = []
+    for block in text.replace('\n ', '').split('\n\n'):
+        attrs = collections.defaultdict(list)
+        for line in block.splitlines():
+            if line.startswith('#') or ':' not in line:
+                continue
+            attr, _, value = line.partition(':')
+            if value.startswith(':'):
+                value = base64.b64decode(value[1:].strip()).decode(errors = 'replace')
+            attrs[attr.lower()].append(value.strip())
+        if attrs:
+            entries.append((block.strip() + '\n', attrs))
+    return entries
+
+def ldap_search(terms, attr, substring):
+    ldap = config.get('ldap', {})
+    cmd = ['ldapsearch', '-x', '-LLL', '-o', 'ldif-wrap=no']
+    if ldap.get('uri'):
+        cmd += ['-H', ldap['uri']]
+    if ldap.get('base'):
+        cmd += ['-b', ldap['base']]
+    pattern = '({attr}=*{term}*)' if substring else '({attr}={term})'
+    batch = ldap.get('batch_size', 200)
+    entries = []
+    for i in range(0, len(terms), batch):
+        query = ''.join(pattern.format(attr = attr, term = ldap_escape(t)) for t in terms[i:i + batch])
+        entries += parse_ldif(runner.output(cmd + [f'(|{query})'], check = True))
+    return entries
+
+def ldap_lookup(attr, terms):
+    # Exact matches for all terms in one OR'd query, then one substring query for the rest
+    found = {t: cache.peek('ldap', f'{attr}={t}') for t in terms}
+    for substring in (False, True):
+        missing = [t for t in terms if not found[t]]
+        if not missing:
+            break
+        entries = ldap_search(missing, attr, substring)
+        for t in missing:
+            key = t.lower()
+            found[t] = [text for text, attrs in entries if any((key in v.lower()) if substring else (key == v.lower()) for v in attrs[attr.lower()])]
+            cache.put('ldap', f'{attr}={t}', found[t])
+    return found
+
+def whois(attr, terms):
+    if shutil.which('ldapsearch') is None:
+        return 'ldapsearch is not availble.\n'
+    terms = list(dict.fromkeys(terms))
+    try:
+        found = ldap_lookup(attr, terms)
+    except CommandError as err:
+        return str(err) + '\n'
+    out = ''
+    for term, entries in found.items():
+        out += ''.join(e + '\n' for e in entries) if entries else f'# {term}: no entry found\n\n'
+    return out
 
 parser = argparse.ArgumentParser(description = 'Small toolbox for Slurm users.', formatter_class = lambda prog: argparse.HelpFormatter(prog,max_help_position = 56))
 parser.add_argument('-a', '--account', action = 'store_true', help = 'show slurm accounts')
@@ -32,8 +439,12 @@ parser.add_argument('-p', '--partition', action = 'store_true', help = 'show par
 parser.add_argument('-u', '--user', nargs = '?', default = user, help = 'user id', metavar = 'UID')
 parser.add_argument('-v', '--version', action = 'version', version = '%(prog)s 1.2')
 parser.add_argument('--eff', type = int, help = 'show efficiency of a job', metavar = 'JOBID')
+parser.add_argument('--eff-report', nargs = '*', help = 'show efficiency of many jobs or job arrays (finished jobs from the --since window if none given)', metavar = 'JOBID')
+parser.add_argument('--window', type = int, help = 'seconds to sample a running job for --eff', metavar = 'SECONDS')
 parser.add_argument('--history', choices = ['day','week','month','year'], help = 'show jobs history for last day/week/month/year')
-parser.add_argument('--pending', action = 'store_true', help = 'show pending jobs')
+parser.add_argument('--since', choices = ['day','week','month','year'], default = 'day', help = 'window of finished jobs for --eff-report without job ids (default: day)')
+parser.add_argument('--limit', type = int, help = 'show at most this many jobs of --history', metavar = 'N')
+parser.add_argument('--pending', action = 'store_true', help = 'show pending jobs with their queue position')
 parser.add_argument('--running', action = 'store_true', help = 'show running jobs')
 parser.add_argument('--qos', action = 'store_true', help = 'show quality of services')
 parser.add_argument('--quota', action = 'store_true', help = 'show quotas')
@@ -43,310 +454,476 @@ parser.add_argument('--gpu', action = 'store_true', help = 'show gpu resources')
 parser.add_argument('--license', action = 'store_true', help = 'show available licenses')
 parser.add_argument('--reserve', action = 'store_true', help = 'show reservation')
 parser.add_argument('--topusage', action = 'store_true', help = 'show top usage users')
-parser.add_argument('--whodat', help = 'show users informations by uid', metavar = 'UID')
-parser.add_argument('--whodat2', help = 'show users informations by name', metavar = 'NAME')
+parser.add_argument('--whodat', nargs = '+', help = 'show users informations by uid', metavar = 'UID')
+parser.add_argument('--whodat2', nargs = '+', help = 'show users informations by name', metavar = 'NAME')
+parser.add_argument('--whodat-file', type = argparse.FileType('r'), help = 'show users informations for uids listed in a file (- for stdin)', metavar = 'FILE')
 parser.add_argument('--agent', choices = ['start','stop','list'], help = 'start/stop/list ssh-agents on the current host')
+parser.add_argument('--clusters', type = lambda names: names.split(','), help = f"query these clusters of config at once for --queue, --running, --pending, --ncpu, --ngpu and --quota (comma separated or all{': ' + ', '.join(clusters) if clusters else ''})", metavar = 'NAMES')
+parser.add_argument('--prompt', action = 'store_true', help = 'print running/pending jobs and ready Jupyter servers for a shell prompt from a cached snapshot')
+parser.add_argument('--prompt-refresh', action = 'store_true', help = argparse.SUPPRESS)
+parser.add_argument('--no-cache', action = 'store_true', help = 'do not read or write cached lookups')
+parser.add_argument('--refresh', action = 'store_true', help = 'ignore cached lookups and refresh them')
+parser.add_argument('--profile', nargs = '?', const = '-', help = 'time external commands; print a summary or append JSON lines to FILE (also SBOX_PROFILE=1|FILE)', metavar = 'FILE')
 args = parser.parse_args()
+# --prompt anywhere but first lands here after the full startup; the answer is the same
+if args.prompt:
+    if args.user != user:
+        parser.error('--prompt only shows your own jobs')
+    import prompt
+    prompt.show()
+args.profile = profiling.target(args.profile)
+if args.profile:
+    profiling.enable('sbox', args.profile)
+if args.whodat_file:
+    args.whodat = (args.whodat or []) + args.whodat_file.read().split()
+cache = Cache(config.get('cache', {}), enabled = not args.no_cache, refresh = args.refresh)
+if args.clusters == ['all']:
+    args.clusters = list(clusters)
+for name in args.clusters or []:
+    if name not in clusters:
+        parser.error(f"unknown cluster {name} (clusters in config: {', '.join(clusters) or 'none'})")
+
+if args.prompt_refresh:
+    from prompt import prompt_file, private
+    if not private():
+        sys.exit(0)
+    # Failures keep the last segment until the next interval instead of retrying on every prompt
+    try:
+        with open(prompt_file) as snap:
+            segment = snap.read().partition('\n')[2]
+    except OSError:
+        segment = ''
+    try:
+        jobs = user_jobs(user, None)
+        counts = {'running': sum(j['state'] == 'RUNNING' for j in jobs), 'pending': sum(j['state'] == 'PENDING' for j in jobs),
+                  'jupyter': sum(j['state'] == 'RUNNING' and j['name'].startswith('jupyter-') for j in jobs)}
+        segment = config.get('prompt_format', '{running}R {pending}PD {jupyter}J').format(**counts)
+    except CommandError:
+        pass
+    try:
+        fd, tmp = tempfile.mkstemp(dir = os.path.dirname(prompt_file))
+        with os.fdopen(fd, 'w') as out:
+            out.write(f"{int(time.time()) + config.get('prompt_interval', 60)}\n{segment}")
+        os.replace(tmp, prompt_file)
+    finally:
+        # A manual --prompt-refresh runs without a lock
+        pathlib.Path(prompt_file + '.lock').unlink(missing_ok = True)
+    sys.exit(0)
 
 if len(sys.argv) == 1:
     parser.print_help(sys.stderr)
     sys.exit(1)
 
-if args.account:
-    print(' Accounts '.center(90,'-'))
-    os.system(f"""
-    sacctmgr show assoc -np user={args.user} format=account | tr "|\n" " " && echo
-    echo
-    """)
-
-if args.fairshare:
-    print(' Fairshare '.center(90,'-'))
-    os.system(f"""
-    sshare -Uu {args.user}
-    echo
-    """)
-
-if args.group:
-    print(' Groups '.center(90,'-'))
-    os.system(f"""
-    groups {args.user}
-    echo
-    """)
-
-if args.queue:
-    print(' Jobs in the Queue '.center(90,'-'))
-    os.system(f"""
-    squeue -u {args.user}
-    echo
-    """)
-
-if args.job:
-    print(' Job Info '.center(90,'-'))
-    os.system(f"""
-    scontrol -dd show job {args.job}
-    """)
-
-if args.cpu:
-    print(' CPU/Mem per Node '.center(90,'-'))
-    os.system("""
-    sjstat -c
-    echo
-    """)
-
-if args.partition:
-    print(' Partitions '.center(90,'-'))
-    os.system("""
-    sinfo -o "%15P %6a %12l %F"
-    echo
-    """)
-
-if args.eff:
-    print(' Job Efficiency '.center(90,'-'))
-    os.system(f"""
-    install -d ~/.seff
-    rm -f ~/.seff/seff.out
-    if sacct -Xj {args.eff} | grep -iq "COMPLETED"; then
-    seff {args.eff}
-    else
-    cat > ~/.seff/seff-job.sh <<EOF
-#!/bin/bash
-#SBATCH --jobid {args.eff}
-top -u $USER -b -n 1 > ~/.seff/seff.out
-EOF
-    sleep 0.1
-    if squeue -j {args.eff} | grep -q '0:00'; then
-    echo 'Job is not running. Retry when the job is started!'
-    exit
-    fi
-    srun --jobid {args.eff} /bin/bash ~/.seff/seff-job.sh
-    while [ ! -f ~/.seff/seff.out ]; do
-    sleep 0.5
-    done
-    cat ~/.seff/seff.out | grep -P "$USER|PID" | grep -v top | grep -v slurm_scri
-    echo
-    echo 'RES: shows resident memory which is accurate representation of how much actual physical memory a process is consuming'
-    echo '%CPU: shows the percentage of the CPU that is being used by the process'
-    fi
-    echo
-    """)
-
-if args.history:
-    print(f" Jobs History - Last {args.history.capitalize()} ".center(123,'-'))
-    os.system(f"""
-    sacct --user {args.user} --state bf,ca,cd,dl,f,nf,pr,s,to --allocations --format jobid%10,user%6,account%7,state%10,partition%9,qos%7,ncpus%5,nnodes%5,reqmem%5,submit,reserved,start,elapsed,end,nodelist%30,jobname%15 -S $(date --date='{args.history} ago' +"%Y-%m-%d")
-    echo
-    """)
-
-if args.running:
-    print(' Running Jobs '.center(90,'-'))
-    os.system(f"""
-    sacct --user {args.user} --state R --allocations --format jobid%10,user%6,account%7,state%10,partition%9,qos%7,ncpus%5,nnodes%5,reqmem%5,submit,reserved,start,elapsed,Timelimit,nodelist%30,jobname%15
-    """)
-
-if args.pending:
-    print(' Pending Jobs '.center(90,'-'))
-    os.system(f"""
-    squeue --user {args.user} --states PENDING --sort S --format "%10i %6u %7a %10T %9P %7q %5C %5D %5m %20V %20S %30Y %10r %j"
-    """)
-
-if args.qos:
-    print(' QOS '.center(90,'-'))
-    os.system(f"""
-    sacctmgr show assoc format=account%15,share%7,qos%56 user={args.user}
-    echo "\n The following shows information about the available quality of services (QOS):\n"
-    sacctmgr show qos format=Name%16,MaxWall,MaxSubmit,GrpTRES%8,GrpJobs,MaxTRES,MaxTRESPU,MaxJobsPU,MaxSubmit
-    echo "\n Note that blank means there is no limit."
-    echo
-    """)
-
-if args.ncpu:
-    print(' Number of CPUs '.center(90,'-'))
-    for p in part_cpu:
-        idle = os.popen(f"""
-        sinfo --partition {p} --Node --format %C | cut --delimiter '/' --fields 2,4 | tr '/' ' ' | awk '{{ sum1 += $1; sum2 += $2 }} END {{ print sum1, sum2 }}'
-        """).read().strip().split()
-        if int(idle[1]) > 0:
-            print('Partition ',p,' has ',idle[0],' cpus available out of ',idle[1],' (',round((int(idle[0])/int(idle[1]))*100),'%)',sep='')
-    print()
-
-if args.ngpu:
-    print(' Number of GPUs '.center(90,'-'))
-    for g in part_gpu:
-        unavail = os.popen(f"""
-        squeue -O jobid,partition,gres,state,username | grep RUNNING | grep -i {g} | awk '{{ print $3 }}' | awk 'BEGIN{{ FS=":" }} {{ total+=$2 }} END{{ print total }}'
-        """).read().strip()
-        try:
-            unavail = int(unavail)
-        except ValueError:
-            unavail = 0
-        
-        total = os.popen(f"""
-        sinfo -p {g} -o %n,%G | grep -Po '(?<=:)\d' | awk '{{ sum1 += $1 }} END {{ print sum1 }}'
-        """).read().strip()
+def account():
+    out = cached('assoc', f'account:{args.user}', ['sacctmgr', 'show', 'assoc', '-nP', f'user={args.user}', 'format=account'])
+    return banner('Accounts') + ' '.join(line.rstrip('|') for line in out.splitlines()) + '\n\n'
+
+def fairshare():
+    return banner('Fairshare') + runner.output(['sshare', '-U', '-u', args.user]) + '\n'
+
+def group():
+    return banner('Groups') + (groups_output(args.user) or f"groups: '{args.user}': no such user\n") + '\n'
+
+def queue():
+    try:
+        jobs = [dict(j, cluster = c) for c, found in across_clusters(lambda c: user_jobs(args.user, None, c)) for j in found]
+        return banner('Jobs in the Queue') + squeue_table(jobs, cluster_columns(queue_columns)) + '\n'
+    except CommandError as err:
+        return banner('Jobs in the Queue') + str(err) + '\n'
+
+def job():
+    return banner('Job Info') + runner.output(['scontrol', '-dd', 'show', 'job', str(args.job)])
+
+def cpu():
+    return banner('CPU/Mem per Node') + runner.output(['sjstat', '-c']) + '\n'
+
+def partition():
+    return banner('Partitions') + cached('partitions', 'partitions', slurm.shared_lookups['partitions'], scope = 'shared') + '\n'
+
+def eff():
+    out = banner('Job Efficiency')
+    try:
+        state = job_state(args.eff)
+    except CommandError as err:
+        return out + str(err) + '\n'
+    wait = config.get('eff_wait', 0)
+    deadline = time.monotonic() + wait
+    while state.startswith('PENDING') and time.monotonic() < deadline:
+        time.sleep(min(5, max(deadline - time.monotonic(), 0)))
+        state = job_state(args.eff)
+    if not state:
+        return out + f'Job {args.eff} not found.\n\n'
+    if state.startswith('PENDING'):
+        return out + (f'Job is not running after waiting {wait} seconds.' if wait else 'Job is pending.') + ' Retry when the job is started!\n\n'
+    if not state.startswith('RUNNING'):
+        return out + runner.output(['seff', str(args.eff)]) + '\n'
+    try:
+        return out + live_efficiency(args.eff, args.window or config.get('eff_window', 10), config.get('eff_interval', 2)) + '\n'
+    except subprocess.TimeoutExpired:
+        return out + f'Timed out reading step accounting for job {args.eff}. Try again later.\n\n'
+    except OSError as err:
+        return out + f'sstat: {err.strerror}\n\n'
+
+def eff_report():
+    cmd = ['sacct', '-n', '-P', '--format', 'JobID,State,Elapsed,TotalCPU,AllocCPUS,NNodes,MaxRSS,ReqMem']
+    if args.eff_report:
+        ids = [i for ids in args.eff_report for i in ids.split(',') if i]
+        cmd += ['-j', ','.join(ids)]
+        title = f"Efficiency Report - {len(ids)} Job IDs"
+    else:
+        window = args.since
+        cmd += ['--user', args.user, '--state', 'cd,f,to,oom,ca,nf', '-S', history_start(window).isoformat()]
+        title = f"Efficiency Report - Last {window.capitalize()}"
+    out = banner(title)
+    try:
+        rows = job_efficiency(runner.output(cmd, check = True).splitlines())
+    except CommandError as err:
+        return out + str(err) + '\n'
+    if not rows:
+        return out + 'No finished jobs found.\n\n'
+    out += f"{'JobID':>16} {'State':>10} {'Elapsed':>10} {'CPUs':>5} {'CPU Eff':>8} {'MaxRSS':>8} {'ReqMem':>8} {'Mem Eff':>8}\n"
+    for j in rows:
+        out += f"{j['jobid']:>16} {j['state']:>10} {str(datetime.timedelta(seconds = int(j['elapsed']))):>10} {j['ncpus']:>5} {j['cpu_eff']:>7.1f}% {human_bytes(j['maxrss']):>8} {human_bytes(j['reqbytes']):>8} {j['mem_eff']:>7.1f}%\n"
+    cpu_eff = [j['cpu_eff'] for j in rows]
+    mem_eff = [j['mem_eff'] for j in rows if j['reqbytes']]
+    used = sum(j['cpu'] for j in rows) / 3600
+    alloc = sum(j['elapsed'] * j['ncpus'] for j in rows) / 3600
+    out += f"\n{len(rows)} jobs, {used:.1f} of {alloc:.1f} allocated cpu hours used ({100 * used / alloc if alloc else 0:.1f}%)\n\n"
+    out += f"{'':12}{'p10':>9}{'median':>9}{'p90':>9}{'mean':>9}\n"
+    for name, values in (('CPU Eff', cpu_eff), ('Mem Eff', mem_eff)):
+        if values:
+            out += f"{name:12}" + ''.join(f"{v:>8.1f}%" for v in percentiles(values) + [statistics.fmean(values)]) + '\n'
+    return out + '\n'
+
+def history():
+    yield banner(f"Jobs History - Last {args.history.capitalize()}", 123)
+    yield format_row([f for f, w in history_fields])
+    yield format_row(['-' * w for f, w in history_fields])
+    try:
+        for i, row in enumerate(history_rows(args.user, args.history)):
+            if args.limit and i >= args.limit:
+                yield f'... more jobs not shown (--limit {args.limit})\n'
+                break
+            yield format_row(row)
+    except CommandError as err:
+        yield str(err)
+    yield '\n'
+
+def running():
+    try:
+        jobs = [dict(j, cluster = c) for c, found in across_clusters(lambda c: user_jobs(args.user, ['RUNNING'], c)) for j in found]
+    except CommandError as err:
+        return banner('Running Jobs') + str(err)
+    fields = [('Cluster', 10)] * bool(args.clusters) + running_fields
+    out = banner('Running Jobs') + format_row([f for f, w in fields], fields) + format_row(['-' * w for f, w in fields], fields)
+    for j in jobs:
+        out += format_row([j['cluster']] * bool(args.clusters) + [j['jobid'], j['user'], j['account'], j['state'], j['partition'], j['qos'], j['cpus'], j['nodes'], j['mem'],
+                           j['submit'], slurm_duration(j['submit'], j['start']), j['start'], j['time'], j['timelimit'], j['nodelist'], j['name']], fields)
+    return out
+
+def pending():
+    try:
+        jobs = [dict(j, cluster = c) for c, found in across_clusters(lambda c: queue_positions(args.user, c))
+                for j in sorted(found, key = lambda j: (j['partition'], int(j['position'])))]
+    except CommandError as err:
+        return banner('Pending Jobs') + str(err)
+    if not jobs:
+        return banner('Pending Jobs') + 'No pending jobs.\n\n'
+    out = banner('Pending Jobs') + squeue_table(jobs, cluster_columns(pending_columns))
+    out += '\n Position counts the pending jobs of the partition in priority order; CPUS_AHEAD sums the cpus they request, once per pending job array.\n'
+    return out + ' START_TIME is the Slurm estimate (N/A until the scheduler sets one).\n\n'
+
+def qos():
+    assoc = cached('assoc', f'qos:{args.user}', ['sacctmgr', 'show', 'assoc', 'format=account%15,share%7,qos%56', f'user={args.user}'])
+    definitions = cached('qos', 'qos', slurm.shared_lookups['qos'], scope = 'shared')
+    return banner('QOS') + assoc + '\n The following shows information about the available quality of services (QOS):\n\n' + definitions + '\n Note that blank means there is no limit.\n\n'
+
+capacity_columns = [('PARTITION', 'partition', 12), ('AVAILABLE', 'avail', -10), ('TOTAL', 'total', -8), ('PERCENT', 'percent', -8)]
+
+def capacity_lines(rows, unit):
+    # A table with a cluster column for merged --clusters views, the original sentences otherwise
+    if args.clusters:
+        return squeue_table(rows, cluster_columns(capacity_columns))
+    return ''.join(f"Partition {r['partition']} has {r['avail']} {unit} available out of {r['total']} ({r['percent']})\n" for r in rows)
+
+def ncpu():
+    rows = []
+    try:
+        found = across_clusters(lambda c: cluster_capacity(cluster_setting(c, 'cpu_partition'), c))
+    except CommandError as err:
+        return banner('Number of CPUs') + str(err) + '\n'
+    for c, capacity in found:
+        for p, cap in capacity.items():
+            if cap['total'] > 0:
+                rows.append({'cluster': c, 'partition': p, 'avail': str(cap['idle']), 'total': str(cap['total']), 'percent': f"{round((cap['idle']/cap['total'])*100)}%"})
+    return banner('Number of CPUs') + capacity_lines(rows, 'cpus') + '\n'
+
+def ngpu():
+    rows = []
+    try:
+        found = across_clusters(lambda c: gpu_usage(cluster_setting(c, 'gpu_partition'), c))
+    except CommandError as err:
+        return banner('Number of GPUs') + str(err) + '\n'
+    for c, usage in found:
+        for g, gpus in usage.items():
+            if gpus['total'] > 0:
+                rows.append({'cluster': c, 'partition': g, 'avail': str(gpus['avail']), 'total': str(gpus['total']), 'percent': f"{round((gpus['avail']/gpus['total'])*100)}%"})
+    return banner('Number of GPUs') + capacity_lines(rows, 'gpus') + '\n'
+
+def gpu():
+    return banner('GPU Resources') + runner.output(['sinfo', '-p', 'Gpu', '-o', '%n,%G']) + '\n'
+
+def licenses():
+    return banner('Licenses') + runner.output(['scontrol', 'show', 'licenses']) + '\n'
+
+def reserve():
+    return banner('Reservations') + runner.output(['scontrol', 'show', 'reserv'])
+
+def topusage():
+    return banner('Top Usage') + runner.output(['sreport', 'user', 'topusage'])
+
+def whodat():
+    return banner('User Info') + whois('uid', args.whodat)
+
+def whodat2():
+    return banner('User Info') + whois('gecos', args.whodat2)
+
+def groups_output(uid):
+    try:
+        return cache.get('groups', uid, lambda: runner.output(['groups', uid], check = True))
+    except CommandError:
+        return ''
+
+def user_groups(uid):
+    out = groups_output(uid)
+    return out.partition(':')[2].split() if ':' in out else out.split()
+
+def is_zero(value):
+    digits = ''.join(c for c in value if c.isdigit() or c == '.')
+    return not digits or float(digits) == 0
+
+def quota_probe(kind, owner, path, timeout):
+    # lfs quota for Lustre paths, df for {path}/{owner} directories elsewhere
+    row = {'owner': owner, 'path': path, 'type': '-', 'used': '-', 'quota': '-', 'limit': '-', 'grace': '-', 'files': '-', 'fquota': '-', 'flimit': '-'}
+    try:
+        # Nodes without the Lustre tools still get the df probe
         try:
-            total = int(total)
-        except ValueError:
-            total = 0
-        
-        avail = total - unavail
-        print('Partition ',g,' has ',avail,' gpus available out of ',total,' (',round((avail/total)*100),'%)',sep='')
-    print()
-
-if args.gpu:
-    print(' GPU Resources '.center(90,'-'))
-    os.system("""
-    sinfo -p Gpu -o %n,%G
-    echo
-    """)
-
-if args.license:
-    print(' Licenses '.center(90,'-'))
-    os.system("""
-    scontrol show licenses
-    echo
-    """)
-
-if args.reserve:
-    print(' Reservations '.center(90,'-'))
-    os.system("""
-    scontrol show reserv
-    """)
-
-if args.topusage:
-    print(' Top Usage '.center(90,'-'))
-    os.system("""
-    sreport user topusage
-    """)
-
-if args.whodat:
-    print(' User Info '.center(90,'-'))
-    os.system(f"""
-    if [ -z `which ldapsearch 2> /dev/null` ]; then echo "ldapsearch is not availble."; exit; fi
-    ldapsearch -x -LLL "(uid=*{args.whodat}*)"
-    """)
-
-if args.whodat2:
-    print(' User Info '.center(90,'-'))
-    os.system(f"""
-    if [ -z `which ldapsearch 2> /dev/null` ]; then echo "ldapsearch is not availble."; exit; fi
-    ldapsearch -x -LLL "(gecos=*{args.whodat2}*)"
-    """)
-
-if args.quota:
+            out = runner.run(['lfs', 'quota', f'-h{kind}', owner, path], timeout).stdout
+        except FileNotFoundError:
+            out = ''
+        tokens = []
+        for line in out.splitlines():
+            if not any(skip in line for skip in ('Disk quotas', 'Filesystem', 'setting', 'gid', 'uid')):
+                tokens += line.split()
+        if len(tokens) >= 9:
+            if all(is_zero(v) for v in tokens[1:4]):
+                return None
+            row.update(zip(['type', 'used', 'quota', 'limit', 'grace', 'files', 'fquota', 'flimit'], ['lustre'] + tokens[1:8]))
+            return row
+        out = runner.run(['df', '-h', '--output=used,size,fstype', f'{path}/{owner}'], timeout).stdout.splitlines()
+    except FileNotFoundError:
+        return None
+    except subprocess.TimeoutExpired:
+        row['type'] = 'timeout'
+        return row
+    if len(out) < 2 or len(out[1].split()) != 3:
+        return None
+    row['used'], row['limit'], row['type'] = out[1].split()
+    return row
+
+def quota_table(probes, path_clusters = None):
+    # Probes run concurrently; results keep the probe order
+    timeout = config.get('quota_timeout', 10)
+    with concurrent.futures.ThreadPoolExecutor(max_workers = config.get('quota_workers', 8)) as pool:
+        rows = [row for row in pool.map(lambda p: quota_probe(*p, timeout), probes) if row]
+    if not rows:
+        return 'No storage quota found.\n'
+    header = {'cluster': 'Cluster'} if path_clusters else {}
+    for row in rows:
+        row['cluster'] = ','.join(path_clusters.get(row['path'], [])) if path_clusters else ''
+    header |= {'owner': 'Owner', 'path': 'Path', 'type': 'Type', 'used': 'Used', 'quota': 'Quota', 'limit': 'Limit', 'grace': 'Grace', 'files': 'Files', 'fquota': 'FQuota', 'flimit': 'FLimit'}
+    rows.insert(0, header)
+    widths = {k: max(len(r[k]) for r in rows) for k in header}
+    return ''.join('  '.join(r[k].ljust(widths[k]) for k in header).rstrip() + '\n' for r in rows)
+
+def quota():
     disk_quota = config['disk_quota_paths']
-    gpn = os.popen(f"""
-    echo $(groups {args.user} | grep -Po "(?<=: ).*")
-    """).read().strip().split()
+    gpn = user_groups(args.user)
     if args.user == user:
-        if args.user not in gpn:
-            for d in disk_quota:
-                os.system(f"""
-                rm -f ~/.quota
-                lfs quota -hu {user} {d} > ~/.quota 2> /dev/null
-                if [ -s ~/.quota ]; then
-                if ! grep -q " 0. * 0. * 0. " ~/.quota; then
-                python3 -c "print(' {user} {d} storage '.center(95,'-'))"
-                cat ~/.quota | grep -Pv "setting|gid|uid";
-                python3 -c "print(''.center(95,'-'))"; fi
-                else if [ -d {d}/{user} ]; then
-                python3 -c "print(' {user} {d} storage '.center(95,'-'))"
-                df -h --output="file,used,pcent,avail,size,fstype" {d}/{user} | tr -s ' ' ',' | sed -e 's/^/,,,/' | column -t -s ',';
-                python3 -c "print(''.center(95,'-'))"; fi
-                fi
-                """)
-        
-        for g in gpn:
-            for d in disk_quota:
-                os.system(f"""
-                rm -f ~/.quota
-                lfs quota -hg {g} {d} > ~/.quota 2> /dev/null
-                if [ -s ~/.quota ]; then
-                if ! grep -q " 0. * 0. * 0. " ~/.quota; then
-                python3 -c "print(' {g} {d} storage '.center(95,'-'))"
-                cat ~/.quota | grep -Pv "setting|gid|uid";
-                python3 -c "print(''.center(95,'-'))"; fi
-                else if [ -d {d}/{g} ]; then
-                python3 -c "print(' {g} {d} storage '.center(95,'-'))"
-                df -h --output="file,used,pcent,avail,size,fstype" {d}/{g} | tr -s ' ' ',' | sed -e 's/^/,,,/' | column -t -s ',';
-                python3 -c "print(''.center(95,'-'))"; fi
-                fi
-                """)
+        # Paths shared by several clusters are probed once and labelled with all of them
+        path_clusters = {}
+        for c in args.clusters or []:
+            for d in cluster_setting(c, 'disk_quota_paths'):
+                path_clusters.setdefault(d, []).append(c)
+        disk_quota = list(path_clusters) or disk_quota
+        probes = [('u', user, d) for d in disk_quota if args.user not in gpn]
+        probes += [('g', g, d) for g in gpn for d in disk_quota]
+        return banner('Storage', 95) + quota_table(probes, path_clusters) + ''.center(95,'-') + '\n'
     
-    else:
-        print(' Home Storage '.center(122,'-'))
-        if args.user in gpn:
-            lfsq = 'g'
-        else:
-            lfsq = 'u'
-        os.system(f"""
-        rm ~/.quota
-        lfs quota -h{lfsq} {args.user} {disk_quota[0]} > ~/.quota 2> /dev/null
-        if [ -s ~/.quota ]; then
-        if ! grep -q " 0. * 0. * 0. " ~/.quota; then
-        cat ~/.quota | grep -Pv "setting|gid|uid";
-        python3 -c "print(''.center(122,'-'))"; fi
-        else if [ -d {disk_quota[0]}/{args.user} ]; then
-        df -h --output="file,used,pcent,avail,size,fstype" {disk_quota[0]}/{args.user} | tr -s ' ' ',' | sed -e 's/^/,,,/' | column -t -s ',';
-        python3 -c "print(''.center(122,'-'))"; fi
-        fi
-        """)
-        
-        gpn = ' '.join(gpn)
-        os.system(f"""
-        if [ -z `which rcss-lfs-quota 2> /dev/null` ]; then echo "No rcss-lfs-quota found! You may try the command from the login node.\n"; exit; fi
-        python -c "print(' HPC Storage '.center(122,'-'))"
-        rcss-lfs-quota {gpn[:]}
-        echo
-        """)
+    lfsq = 'g' if args.user in gpn else 'u'
+    out = banner('Home Storage', 122) + quota_table([(lfsq, args.user, disk_quota[0])]) + ''.center(122,'-') + '\n'
+    try:
+        out += banner('HPC Storage', 122) + runner.run(['rcss-lfs-quota', *gpn], merge = True).stdout + '\n'
+    except FileNotFoundError:
+        out += 'No rcss-lfs-quota found! You may try the command from the login node.\n\n'
+    except subprocess.TimeoutExpired as err:
+        out += f'rcss-lfs-quota: timed out after {err.timeout:g} seconds\n\n'
+    return out
 
-if args.agent:
-    if args.agent == 'start':
-        os.system("""
-        if [ -z `which ssh-agent 2> /dev/null` ]; then echo "No ssh-agent found!"; exit; fi
-        if [ -f ~/.ssh/id_rsa ]; then
-        if ! ps -elf | grep ssh-agent | grep -v grep | grep -q $USER; then
-        echo "Starting an agent on $(hostname) ..."
-        install -d ~/.ssh_auth
-        eval `ssh-agent -s`
-        ssh-add
-        echo $SSH_AUTH_SOCK > ~/.ssh_auth/$(hostname)
-        if ! grep -q SSH_AUTH_SOCK ~/.bashrc; then
-        echo "
+agent_bashrc = """
 # >>> ssh-agent >>>
-if [ -f ~/.ssh_auth/\$(hostname) ]; then
-export SSH_AUTH_SOCK=\`cat ~/.ssh_auth/\$(hostname)\`
+if [ -f ~/.ssh_auth/$(hostname) ]; then
+export SSH_AUTH_SOCK=`cat ~/.ssh_auth/$(hostname)`
 fi
 # <<< ssh-agent <<<
-" >> ~/.bashrc
-        fi
-        echo "The ssh-agent authentication is added to ~/.bashrc. $(tput bold)Run 'source ~/.bashrc' to apply the changes.$(tput sgr0)"
-        else
-        if [ -z $SSH_AUTH_SOCK ]; then
-        echo "An agent is running but the authentication is not available. Stop the agent with -k and rerun the command."
-        fi
-        echo "The ssh-agent is running on $(hostname)."
-        fi
-        else
-        echo "SSH keys not found. Add your id_rsa keys to '~/.ssh'."
-        fi
-        """)
-
-    if args.agent == 'stop':
-        os.system("""
-        if ps -elf | grep ssh-agent | grep -v grep | grep -q $USER; then
-        echo "Stopping the current agent on $(hostname) ..."
-        kill `ps -elf | grep ssh-agent | grep -v grep | grep $USER | awk '{print $4}'`
-        rm -f ~/.ssh_auth/$(hostname)
-        else
-        echo "No running agent found on $(hostname)."
-        fi
-        """)
-
-    if args.agent == 'list':
-        os.system("""
-        if ps -elf | grep ssh-agent | grep -v grep | grep -q $USER; then
-        ps -elf | grep ssh-agent | grep -v grep | grep $USER
-        else
-        echo "No running agent found on $(hostname)."
-        fi
-        """)
+"""
+
+def agent_processes():
+    # The caller's ssh-agent processes from /proc; other users' agents are skipped by uid, not by name
+    uid = os.getuid()
+    agents = []
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            if os.stat(f'/proc/{pid}').st_uid != uid:
+                continue
+            # pid (comm) state ...; exited agents linger as zombies until reaped
+            with open(f'/proc/{pid}/stat') as stat:
+                comm, _, rest = stat.read().partition(' (')[2].rpartition(') ')
+            if comm != 'ssh-agent' or rest[:1] == 'Z':
+                continue
+            with open(f'/proc/{pid}/cmdline', 'rb') as cmdline:
+                agents.append((int(pid), cmdline.read().replace(b'\0', b' ').decode(errors = 'replace').strip()))
+        except OSError:
+            continue
+    return sorted(agents)
+
+def agent_keys(path):
+    # Number of identities held by the agent listening on path, None when nothing answers there
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(2)
+            conn.connect(path)
+            # SSH_AGENTC_REQUEST_IDENTITIES; the answer is SSH_AGENT_IDENTITIES_ANSWER with a key count
+            conn.sendall(b'\0\0\0\1\x0b')
+            reply = b''
+            while len(reply) < 9:
+                chunk = conn.recv(9 - len(reply))
+                if not chunk:
+                    break
+                reply += chunk
+    except OSError:
+        return None
+    if len(reply) < 9 or reply[4] != 12:
+        return None
+    return int.from_bytes(reply[5:9], 'big')
+
+def agent_record():
+    # (record file, recorded socket, keys) with stale records removed
+    record = pathlib.Path.home() / '.ssh_auth' / host_name
+    try:
+        path = record.read_text().strip()
+    except OSError:
+        return record, None, None
+    keys = agent_keys(path) if path else None
+    if keys is None:
+        record.unlink(missing_ok = True)
+        print(f"Removed the stale agent record {record}.")
+        return record, None, None
+    return record, path, keys
+
+def agent_start():
+    if shutil.which('ssh-agent') is None:
+        print("No ssh-agent found!")
+        return
+    if not (pathlib.Path.home() / '.ssh' / 'id_rsa').is_file():
+        print("SSH keys not found. Add your id_rsa keys to '~/.ssh'.")
+        return
+    record, path, keys = agent_record()
+    if path:
+        print(f"The ssh-agent is running on {host_name} with {keys} keys ({path}).")
+        if os.getenv('SSH_AUTH_SOCK') != path:
+            print("\033[1mRun 'source ~/.bashrc' to use it in this shell.\033[0m")
+        return
+    if agent_processes():
+        print("An agent is running but the authentication is not available. Stop the agent with --agent stop and rerun the command.")
+        return
+    print(f"Starting an agent on {host_name} ...")
+    out = runner.run(['ssh-agent', '-s']).stdout
+    env = dict(line.split(';', 1)[0].split('=', 1) for line in out.splitlines() if line.startswith(('SSH_AUTH_SOCK=', 'SSH_AGENT_PID=')))
+    if 'SSH_AUTH_SOCK' not in env:
+        print(f"ssh-agent did not start: {out.strip()}")
+        return
+    print(f"Agent pid {env.get('SSH_AGENT_PID')}")
+    subprocess.run(['ssh-add'], env = dict(os.environ, **env))
+    record.parent.mkdir(mode = 0o700, exist_ok = True)
+    record.write_text(env['SSH_AUTH_SOCK'] + '\n')
+    bashrc = pathlib.Path.home() / '.bashrc'
+    if not bashrc.is_file() or 'SSH_AUTH_SOCK' not in bashrc.read_text():
+        with open(bashrc, 'a') as rc:
+            rc.write(agent_bashrc)
+    print("The ssh-agent authentication is added to ~/.bashrc. \033[1mRun 'source ~/.bashrc' to apply the changes.\033[0m")
+
+def agent_stop():
+    agents = agent_processes()
+    record = pathlib.Path.home() / '.ssh_auth' / host_name
+    if not agents:
+        record.unlink(missing_ok = True)
+        print(f"No running agent found on {host_name}.")
+        return
+    print(f"Stopping the current agent on {host_name} ...")
+    for pid, cmdline in agents:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    record.unlink(missing_ok = True)
+
+def agent_list():
+    record, path, keys = agent_record()
+    agents = agent_processes()
+    if not agents:
+        print(f"No running agent found on {host_name}.")
+        return
+    print(f"{'PID':>8}  COMMAND")
+    for pid, cmdline in agents:
+        print(f"{pid:>8}  {cmdline}")
+    print(f"\nRecorded socket {path} holds {keys} keys." if path else f"\nNo usable socket is recorded in {record}.")
+
+# Sections are independent queries; run them concurrently and print in flag order
+sections = [
+    (args.account, account),
+    (args.fairshare, fairshare),
+    (args.group, group),
+    (args.queue, queue),
+    (args.job, job),
+    (args.cpu, cpu),
+    (args.partition, partition),
+    (args.eff, eff),
+    (args.eff_report is not None, eff_report),
+    (args.history, history),
+    (args.running, running),
+    (args.pending, pending),
+    (args.qos, qos),
+    (args.ncpu, ncpu),
+    (args.ngpu, ngpu),
+    (args.gpu, gpu),
+    (args.license, licenses),
+    (args.reserve, reserve),
+    (args.topusage, topusage),
+    (args.whodat, whodat),
+    (args.whodat2, whodat2),
+    (args.quota, quota),
+]
+selected = [section for flag, section in sections if flag]
+if selected:
+    with concurrent.futures.ThreadPoolExecutor(max_workers = min(config.get('max_workers', 8), len(selected))) as pool:
+        for out in pool.map(lambda section: profiling.in_section(section.__name__, section), selected):
+            if isinstance(out, str):
+                print(out, end = '', flush = True)
+            else:
+                page(out)
+
+if args.agent:
+    {'start': agent_start, 'stop': agent_stop, 'list': agent_list}[args.agent]()
@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+# =============================================================================
+# Author: Ashkan Mirzaee
+# Organization: University of Missouri RCSS
+# License: GPL-3.0
+# Date: 2026/10/18
+# Source: https://github.com/ashki23/sbox
+# =============================================================================
+
+import os
+import pwd
+import sys
+import json
+import time
+import socket
+import signal
+import struct
+import pathlib
+import argparse
+import threading
+import subprocess
+import socketserver
+import concurrent.futures
+import slurm
+from cache import Cache
+
+with open(f'{pathlib.Path(__file__).parent.absolute()}/config') as cfg:
+    config = json.load(cfg)
+
+parser = argparse.ArgumentParser(description = 'Node-local Slurm snapshot daemon for sbox.', formatter_class = lambda prog: argparse.HelpFormatter(prog,max_help_position = 56))
+parser.add_argument('-s', '--socket', default = config.get('sboxd_socket', '/run/sboxd/sboxd.sock'), help = 'unix socket path', metavar = 'PATH')
+parser.add_argument('-i', '--interval', type = int, default = config.get('sboxd_interval', 30), help = 'seconds between snapshots', metavar = 'SECONDS')
+args = parser.parse_args()
+cache = Cache(config.get('cache', {}))
+
+
+class Snapshot:
+    # One sinfo, squeue and sprio poll, kept as tuples with a per-user index
+    def __init__(self, nodes, jobs, priorities):
+        self.time = time.time()
+        self.nodes = nodes
+        self.jobs = jobs
+        self.by_user = {}
+        user, state, nodelist, gres = (slurm.job_index[f] for f in ('user', 'state', 'nodelist', 'gres'))
+        for i, job in enumerate(jobs):
+            self.by_user.setdefault(job[user], []).append(i)
+        self.running = [(job[gres], job[nodelist]) for job in jobs if job[state] == 'RUNNING']
+        self.positions = slurm.queue_positions(jobs, priorities)
+
+
+snapshot = None
+
+def poll():
+    commands = [
+        ['sinfo', '--noheader', '--Node', '--format', slurm.node_format],
+        ['squeue', '--noheader', '--all', '--format', slurm.job_format],
+    ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 3) as pool:
+        sprio = pool.submit(subprocess.run, ['sprio', '--noheader', '--format', slurm.priority_format], capture_output = True, text = True, timeout = args.interval)
+        nodes, jobs = pool.map(lambda cmd: subprocess.run(cmd, capture_output = True, text = True, timeout = args.interval, check = True).stdout, commands)
+    # Same ranking as sbox without the daemon: per-partition sprio priorities, the squeue priority when sprio fails
+    try:
+        priorities = slurm.parse_priorities(sprio.result().stdout)
+    except (OSError, subprocess.SubprocessError):
+        priorities = {}
+    # Interning keeps repeated users, accounts, partitions and states as one object each
+    jobs = [tuple(sys.intern(f) for f in job) for job in slurm.parse_jobs(jobs)]
+    return Snapshot(slurm.parse_nodes(nodes), jobs, priorities)
+
+def poller():
+    global snapshot
+    while True:
+        try:
+            snapshot = poll()
+        except (OSError, subprocess.SubprocessError) as err:
+            print(f'sboxd: poll failed: {err}', file = sys.stderr, flush = True)
+        time.sleep(args.interval)
+
+def warmer():
+    # Refill the shared cache entries at half their ttl; users trust them when sboxd runs as root or a trusted_uids service uid
+    refreshed = {}
+    while True:
+        for kind, argv in slurm.shared_lookups.items():
+            ttl = cache.ttl.get(kind, 0)
+            if ttl <= 0 or time.time() - refreshed.get(kind, 0) < ttl / 2:
+                continue
+            try:
+                proc = subprocess.run(argv, capture_output = True, text = True, timeout = ttl / 2)
+            except (OSError, subprocess.SubprocessError) as err:
+                print(f'sboxd: {kind} refresh failed: {err}', file = sys.stderr, flush = True)
+                continue
+            if proc.returncode != 0:
+                print(f'sboxd: {kind} refresh failed: {proc.stderr.strip()}', file = sys.stderr, flush = True)
+                continue
+            cache.put(kind, kind, proc.stdout, 'shared')
+            refreshed[kind] = time.time()
+        time.sleep(args.interval)
+
+def peer_user(conn):
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    pid, uid, gid = struct.unpack('3i', creds)
+    return uid, pwd.getpwuid(uid).pw_name
+
+def answer(request, conn):
+    snap = snapshot
+    if snap is None or time.time() - snap.time > 3 * args.interval:
+        return {'error': 'no recent snapshot'}
+    op = request.get('op')
+    if op in ('jobs', 'positions'):
+        uid, name = peer_user(conn)
+        if config.get('sboxd_private', True) and uid != 0 and request['user'] != name:
+            return {'error': 'permission denied'}
+    if op == 'capacity':
+        data = slurm.capacity(snap.nodes, request['partitions'])
+    elif op == 'gpus':
+        data = slurm.gpu_usage(snap.nodes, snap.running, request['partitions'])
+    elif op == 'positions':
+        jobs = [snap.jobs[i] for i in snap.by_user.get(request['user'], [])]
+        data = {'fields': [f for f, code in slurm.job_fields] + slurm.position_fields, 'rows': slurm.user_positions(jobs, snap.positions, request['user'])}
+    elif op == 'jobs':
+        states = request.get('states')
+        state = slurm.job_index['state']
+        rows = [snap.jobs[i] for i in snap.by_user.get(request['user'], []) if not states or snap.jobs[i][state] in states]
+        data = {'fields': [f for f, code in slurm.job_fields], 'rows': rows}
+    else:
+        return {'error': f'unknown op {op}'}
+    return {'age': round(time.time() - snap.time, 1), 'data': data}
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline(65536))
+            if not isinstance(request, dict):
+                raise TypeError('expected a JSON object')
+            reply = answer(request, self.connection)
+        except (ValueError, KeyError, TypeError) as err:
+            reply = {'error': f'bad request: {err}'}
+        self.wfile.write((json.dumps(reply, separators = (',', ':')) + '\n').encode())
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+os.makedirs(os.path.dirname(args.socket), exist_ok = True)
+if os.path.exists(args.socket):
+    os.unlink(args.socket)
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+threading.Thread(target = poller, daemon = True).start()
+threading.Thread(target = warmer, daemon = True).start()
+with Server(args.socket, Handler) as server:
+    os.chmod(args.socket, 0o666)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.unlink(args.socket)
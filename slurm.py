@@ -0,0 +1,185 @@
+# =============================================================================
+# Author: Ashkan Mirzaee
+# Organization: University of Missouri RCSS
+# License: GPL-3.0
+# Date: 2026/10/18
+# Source: https://github.com/ashki23/sbox
+# =============================================================================
+
+import re
+import collections
+
+# sinfo --Node rows: partition, node, cpus A/I/O/T, memory, free memory, gres
+node_format = '%R|%N|%C|%m|%e|%G'
+
+# squeue rows; the job name goes last since it may contain the separator
+job_fields = [('jobid', '%i'), ('user', '%u'), ('account', '%a'), ('state', '%T'), ('st', '%t'), ('partition', '%P'), ('qos', '%q'),
+              ('cpus', '%C'), ('nodes', '%D'), ('mem', '%m'), ('submit', '%V'), ('start', '%S'), ('time', '%M'), ('timelimit', '%l'),
+              ('nodelist', '%N'), ('reason_list', '%R'), ('sched_nodes', '%Y'), ('reason', '%r'), ('gres', '%b'), ('priority', '%Q'), ('name', '%j')]
+job_format = '|'.join(code for name, code in job_fields)
+job_index = {name: i for i, (name, code) in enumerate(job_fields)}
+
+# Node-wide lookups kept in the shared cache scope under their own name; sboxd refreshes them as a trusted writer
+shared_lookups = {
+    'partitions': ['sinfo', '-o', '%15P %6a %12l %F'],
+    'qos': ['sacctmgr', 'show', 'qos', 'format=Name%16,MaxWall,MaxSubmit,GrpTRES%8,GrpJobs,MaxTRES,MaxTRESPU,MaxJobsPU,MaxSubmit'],
+}
+
+def split_top_level(text, sep = ','):
+    # Split on separators that are not inside brackets or parentheses
+    parts, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c in '[(':
+            depth += 1
+        elif c in '])':
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p for p in parts if p]
+
+def expand_hostlist(hostlist):
+    # gpu[01-03,05],c1 -> gpu01 gpu02 gpu03 gpu05 c1
+    hosts = []
+    for item in split_top_level(hostlist):
+        if '[' not in item:
+            hosts.append(item)
+            continue
+        prefix, rest = item.split('[', 1)
+        ranges, suffix = rest.split(']', 1)
+        for r in ranges.split(','):
+            lo, _, hi = r.partition('-')
+            for n in range(int(lo), int(hi or lo) + 1):
+                hosts.extend(prefix + str(n).zfill(len(lo)) + h for h in (expand_hostlist(suffix) if suffix else ['']))
+    return hosts
+
+def parse_gres(gres):
+    # gpu:a100:8(S:0-1),gres/gpu:2,mps:400 -> [('gpu', 'a100', 8), ('gpu', None, 2), ('mps', None, 400)]
+    parsed = []
+    for item in split_top_level(gres):
+        item = item.split('(', 1)[0].strip()
+        for prefix in ('gres:', 'gres/'):
+            if item.startswith(prefix):
+                item = item[len(prefix):]
+        fields = item.split(':')
+        if not fields[0] or fields[0] in ('N/A', '(null)'):
+            continue
+        count = 1
+        if len(fields) > 1 and fields[-1].isdigit():
+            count = int(fields.pop())
+        gtype = fields[1] if len(fields) > 1 else None
+        parsed.append((fields[0], gtype, count))
+    return parsed
+
+def gpu_count(gres):
+    return sum(count for name, gtype, count in parse_gres(gres) if name == 'gpu')
+
+def parse_nodes(out):
+    # sinfo --Node --format node_format -> [(partition, node, cpus, mem, free_mem, gres)]
+    nodes = []
+    for line in out.splitlines():
+        fields = line.strip().split('|')
+        if len(fields) == 6:
+            fields[0] = fields[0].rstrip('*')
+            nodes.append(tuple(fields))
+    return nodes
+
+def parse_jobs(out):
+    # squeue --format job_format -> [tuple in job_fields order]
+    jobs = []
+    for line in out.splitlines():
+        fields = line.split('|', len(job_fields) - 1)
+        if len(fields) == len(job_fields):
+            jobs.append(tuple(fields))
+    return jobs
+
+def capacity(nodes, partitions):
+    # CPUs and memory summed per partition
+    cap = {p: {'alloc': 0, 'idle': 0, 'other': 0, 'total': 0, 'nodes': 0, 'mem': 0, 'free_mem': 0} for p in partitions}
+    for part, node, cpus, mem, free_mem, gres in nodes:
+        cpus = cpus.split('/')
+        if part not in cap or len(cpus) != 4 or not all(c.isdigit() for c in cpus):
+            continue
+        c = cap[part]
+        c['alloc'] += int(cpus[0])
+        c['idle'] += int(cpus[1])
+        c['other'] += int(cpus[2])
+        c['total'] += int(cpus[3])
+        c['nodes'] += 1
+        c['mem'] += int(mem) if mem.isdigit() else 0
+        c['free_mem'] += int(free_mem) if free_mem.isdigit() else 0
+    return cap
+
+def gpu_usage(nodes, running, partitions):
+    # GPUs used per node by running jobs [(gres, nodelist)], compared to each node's total and summed per partition
+    node_total, part_nodes = {}, collections.defaultdict(set)
+    for part, node, cpus, mem, free_mem, gres in nodes:
+        node_total[node] = gpu_count(gres)
+        part_nodes[part].add(node)
+
+    node_used = collections.Counter()
+    for gres, nodelist in running:
+        per_node = gpu_count(gres)
+        if per_node == 0:
+            continue
+        for node in expand_hostlist(nodelist):
+            if node in node_total:
+                node_used[node] += per_node
+
+    usage = {}
+    for p in partitions:
+        total = sum(node_total[n] for n in part_nodes[p])
+        used = sum(min(node_used[n], node_total[n]) for n in part_nodes[p])
+        usage[p] = {'total': total, 'used': used, 'avail': total - used, 'nodes': len(part_nodes[p])}
+    return usage
+
+# sprio rows: job id, partition, priority
+priority_format = '%i|%r|%Y'
+
+def parse_priorities(out):
+    # sprio --format priority_format -> {(jobid, partition): priority}
+    priorities = {}
+    for line in out.splitlines():
+        fields = line.strip().split('|')
+        if len(fields) == 3 and fields[2].isdigit():
+            priorities[fields[0], fields[1]] = int(fields[2])
+    return priorities
+
+def queue_positions(jobs, priorities = None):
+    # Pending jobs of each partition sorted the way the scheduler walks them (priority, submit time, job id):
+    # {(jobid, partition): (position, queue length, cpus ahead, priority)}
+    # A pending array is one squeue row, so cpus ahead counts its cpus once rather than once per task
+    jobid, state, part, cpus, submit, prio = (job_index[f] for f in ('jobid', 'state', 'partition', 'cpus', 'submit', 'priority'))
+    priorities = priorities or {}
+    queues = collections.defaultdict(list)
+    for job in jobs:
+        if job[state] != 'PENDING':
+            continue
+        ncpus = int(job[cpus]) if job[cpus].isdigit() else 0
+        for p in job[part].split(','):
+            priority = priorities.get((job[jobid], p), int(job[prio]) if job[prio].isdigit() else 0)
+            # Job ids compare as numbers (9999 before 10000); array and het suffixes break the remaining ties
+            number = re.match(r'\d*', job[jobid]).group()
+            queues[p].append((-priority, job[submit], int(number or 0), job[jobid], ncpus))
+    positions = {}
+    for p, queue in queues.items():
+        queue.sort()
+        ahead = 0
+        for position, (priority, submitted, number, job_id, ncpus) in enumerate(queue, 1):
+            positions[job_id, p] = (position, len(queue), ahead, -priority)
+            ahead += ncpus
+    return positions
+
+position_fields = ['position', 'queued', 'cpus_ahead', 'priority']
+
+def user_positions(jobs, positions, uid):
+    # One row per pending job of uid and partition it waits in: the job fields followed by position_fields
+    jobid, user, state, part = (job_index[f] for f in ('jobid', 'user', 'state', 'partition'))
+    rows = []
+    for job in jobs:
+        if job[user] == uid and job[state] == 'PENDING':
+            for p in job[part].split(','):
+                if (job[jobid], p) in positions:
+                    rows.append(job[:part] + (p,) + job[part + 1:] + positions[job[jobid], p])
+    return rows